@@ -0,0 +1,265 @@
+import json
+import os
+import shutil
+from argparse import ArgumentParser
+from dataclasses import asdict, dataclass
+from typing import Iterator, List
+
+import numpy as np
+
+FIRST_NAMES = [
+    "Alice",
+    "Bob",
+    "Carol",
+    "Dan",
+    "Eve",
+    "Frank",
+    "Grace",
+    "Heidi",
+    "Ivan",
+    "Judy",
+    "Mallory",
+    "Niaj",
+    "Olivia",
+    "Peggy",
+    "Rupert",
+    "Sybil",
+    "Trent",
+    "Victor",
+    "Walter",
+    "Zoë",
+]
+LAST_NAMES = [
+    "Smith",
+    "Jones",
+    "White",
+    "Brown",
+    "Black",
+    "Green",
+    "Müller",
+    "García",
+    "Nguyen",
+    "Kowalski",
+    "O'Brien",
+    "Søndergaard",
+]
+# short messages people send over and over
+PHRASES = [
+    "lol",
+    "ok",
+    "haha",
+    "yes",
+    "no",
+    "same",
+    "omg",
+    "👍",
+    "😂😂",
+    "good night",
+    "on my way",
+    "what",
+    "nice",
+    "ty",
+    "❤️",
+    "sent an attachment.",
+]
+REACTIONS = ["😍", "😆", "😮", "😢", "😠", "👍", "👎", "❤"]
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "ta", "vi", "so", "pe", "da", "ño", "zé"]
+
+
+@dataclass(frozen=True)
+class ExportSpec:
+    """
+    Shape of a synthetic chat export. Generation is deterministic for a
+    given spec, so the same spec always produces the same files.
+    """
+
+    messages: int = 10_000
+    participants: int = 6
+    # average number of reactions per message
+    reaction_density: float = 0.3
+    # share of messages that are one of a few common phrases
+    repetition: float = 0.3
+    # messages per message_N.json file, Facebook splits exports every 10000
+    file_size: int = 10_000
+    photo_rate: float = 0.02
+    # distinct made up words in the vocabulary of longer messages
+    vocabulary: int = 20_000
+    # mean time between messages
+    interval_ms: int = 15 * 60 * 1000
+    start_ms: int = 1_500_000_000_000
+    seed: int = 0
+
+
+def mojibake(text: str) -> str:
+    """
+    Encodes text the way Facebook exports do: its utf-8 bytes written as
+    latin-1 characters.
+    """
+    return text.encode("utf-8").decode("latin-1")
+
+
+def participant_names(count: int) -> List[str]:
+    names = []
+    for i in range(count):
+        first = FIRST_NAMES[i % len(FIRST_NAMES)]
+        last = LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)]
+        generation = i // (len(FIRST_NAMES) * len(LAST_NAMES))
+        names.append(f"{first} {last}" + (f" {generation + 1}" if generation else ""))
+    return names
+
+
+def _vocabulary(rng: np.random.Generator, size: int) -> List[str]:
+    lengths = rng.integers(1, 5, size=size)
+    picks = rng.integers(0, len(SYLLABLES), size=int(lengths.sum()))
+    words, start = [], 0
+    for n in lengths.tolist():
+        words.append("".join(SYLLABLES[p] for p in picks[start : start + n]))
+        start += n
+    return words
+
+
+def iter_messages(spec: ExportSpec, names: List[str]) -> Iterator[dict]:
+    """
+    Yields messages oldest first. Senders follow a Zipf like distribution,
+    texts are either common phrases, which makes contents repeat, or
+    sentences over a vocabulary with a Zipf word distribution that mention
+    other participants now and then.
+    """
+    rng = np.random.default_rng(spec.seed)
+    vocabulary = _vocabulary(rng, spec.vocabulary)
+    weights = 1 / np.arange(1, len(names) + 1)
+    sender_p = weights / weights.sum()
+    first_names = [n.split(" ")[0] for n in names]
+
+    block = 100_000
+    timestamp = spec.start_ms
+    for offset in range(0, spec.messages, block):
+        n = min(block, spec.messages - offset)
+        gaps = rng.exponential(spec.interval_ms, size=n).astype(np.int64) + 1
+        senders = rng.choice(len(names), size=n, p=sender_p)
+        repeated = rng.random(n) < spec.repetition
+        phrases = rng.integers(0, len(PHRASES), size=n)
+        photos = rng.random(n) < spec.photo_rate
+        lengths = rng.integers(1, 12, size=n)
+        words = rng.zipf(1.3, size=int(lengths.sum())) % len(vocabulary)
+        mentions = rng.random(n) < 0.05
+        mentioned = rng.integers(0, len(names), size=n)
+        reacts = rng.poisson(spec.reaction_density, size=n)
+        reactors = rng.integers(0, len(names), size=int(reacts.sum()))
+        kinds = rng.integers(0, len(REACTIONS), size=int(reacts.sum()))
+
+        word, react = 0, 0
+        for i in range(n):
+            timestamp += int(gaps[i])
+            msg = {
+                "sender_name": mojibake(names[senders[i]]),
+                "timestamp_ms": timestamp,
+            }
+            if photos[i]:
+                msg["photos"] = [
+                    {"uri": "photo.jpg", "creation_timestamp": timestamp // 1000}
+                ]
+            elif repeated[i]:
+                msg["content"] = mojibake(PHRASES[phrases[i]])
+            else:
+                text = " ".join(vocabulary[w] for w in words[word : word + lengths[i]])
+                if mentions[i]:
+                    text = f"{first_names[mentioned[i]]} {text}"
+                msg["content"] = mojibake(text)
+            word += lengths[i]
+            if reacts[i]:
+                msg["reactions"] = [
+                    {
+                        "reaction": mojibake(REACTIONS[kinds[r]]),
+                        "actor": mojibake(names[reactors[r]]),
+                    }
+                    for r in range(react, react + reacts[i])
+                ]
+                react += reacts[i]
+            msg["type"] = "Generic"
+            yield msg
+
+
+def write_export(spec: ExportSpec, directory: str) -> List[str]:
+    """
+    Writes a chat export under directory as message_1.json (newest) to
+    message_N.json (oldest), messages newest first within each file, like
+    Facebook does. Returns the written paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    names = participant_names(spec.participants)
+    n_files = max(1, -(-spec.messages // spec.file_size))
+    header = {
+        "participants": [{"name": mojibake(n)} for n in names],
+        "title": mojibake(os.path.basename(os.path.normpath(directory))),
+        "is_still_participant": True,
+        "thread_type": "RegularGroup",
+        "thread_path": f"inbox/{os.path.basename(os.path.normpath(directory))}",
+    }
+
+    paths = []
+    messages = iter_messages(spec, names)
+    for i in range(n_files, 0, -1):
+        count = min(spec.file_size, spec.messages - (n_files - i) * spec.file_size)
+        chunk = [next(messages) for _ in range(count)]
+        chunk.reverse()
+        path = os.path.join(directory, f"message_{i}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**header, "messages": chunk}, f)
+        paths.append(path)
+
+    with open(os.path.join(directory, "spec.json"), "w", encoding="utf-8") as f:
+        json.dump(asdict(spec), f)
+    return paths
+
+
+def ensure_export(spec: ExportSpec, directory: str) -> bool:
+    """
+    Writes the export unless directory already holds one of the same spec.
+    Returns whether it was written.
+    """
+    try:
+        with open(os.path.join(directory, "spec.json"), encoding="utf-8") as f:
+            if json.load(f) == asdict(spec):
+                return False
+    except (OSError, ValueError):
+        pass
+    shutil.rmtree(directory, ignore_errors=True)
+    write_export(spec, directory)
+    return True
+
+
+def construct_argparser() -> ArgumentParser:
+    defaults = ExportSpec()
+    parser = ArgumentParser(description="write a synthetic chat export")
+    parser.add_argument(
+        "--chat",
+        type=str,
+        default="synthetic_0",
+        help="name of the chat directory created under the inbox",
+    )
+    parser.add_argument(
+        "--inbox",
+        type=str,
+        default="./messages/inbox/",
+        help="inbox directory to write the chat to",
+    )
+    for field, value in asdict(defaults).items():
+        parser.add_argument(
+            f"--{field.replace('_', '-')}",
+            type=type(value),
+            default=value,
+            help=f"defaults to {value}",
+        )
+    return parser
+
+
+def main():
+    args = vars(construct_argparser().parse_args())
+    chat, inbox = args.pop("chat"), args.pop("inbox")
+    paths = write_export(ExportSpec(**args), os.path.join(inbox, chat))
+    print(f"wrote {len(paths)} files to {os.path.join(inbox, chat)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import json
+import os
+import platform
+import subprocess
+from argparse import ArgumentParser
+from dataclasses import asdict, replace
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import profiler
+from benchmark.generate import ExportSpec, ensure_export
+from metrics.context import ChatContext
+from metrics.factory import provide_metric
+from metrics.figure import LineChart, RenderOptions
+from metrics.registry import BUILTIN_METRICS
+from metrics.render import Renderer
+from metrics.state import ChatState
+from parse import generate_df, parse_messages, setup
+from profiler import measure
+from status import Timing
+
+SIZES = [10_000, 100_000, 1_000_000]
+WORKDIR = "./.bench"
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_size(spec: ExportSpec, jobs: int) -> List[Timing]:
+    """
+    Times every stage on an export of spec, which must already be written
+    to ./messages/inbox/synthetic_<messages>/.
+    """
+    chat = f"synthetic_{spec.messages}"
+    timings = []
+
+    with measure("generate_df") as timing:
+        df = generate_df(f"./messages/inbox/{chat}/message_1.json")
+        timing.rows = len(df)
+    timings.append(timing)
+    del df
+
+    with measure("parse_messages", rows=spec.messages) as timing:
+        table = parse_messages(chat, jobs=jobs)
+    timings.append(timing)
+
+    with measure("state", rows=len(table)) as timing:
+        state = ChatState.from_table(table)
+    timings.append(timing)
+
+    renderer = Renderer()
+    for name in BUILTIN_METRICS:
+        # a fresh context per metric, so each pays for the data it derives
+        metric = provide_metric(
+            name=name,
+            context=ChatContext(state, table),
+            filter_top=True,
+            filter_bottom=True,
+            filter_words=["lol", "good night"],
+            windows=[7, 40],
+        )
+        status, figures = metric.compute()
+        timings += status.timings
+        if not status.success:
+            print(f"Metric '{name}' failed: {status.message}")
+        renderer.submit(name, figures)
+    renderer.wait()
+    for name in BUILTIN_METRICS:
+        timings += renderer.timings[name]
+    return timings
+
+
+def _render_stage(stage: str) -> str:
+    # charts are titled after the metric, group them under one stage
+    return "render" if stage.startswith("render ") else stage
+
+
+def summarize(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    Wall seconds and peak megabytes of every stage at every size, with the
+    scaling exponent between the two largest sizes: 1 is linear.
+    """
+    results = results.assign(stage=results["stage"].map(_render_stage))
+    grouped = results.groupby(["stage", "size"], sort=False).agg(
+        wall=("wall", "sum"), peak_memory=("peak_memory", "max")
+    )
+    wall = grouped["wall"].unstack("size")
+    summary = wall.round(3).add_prefix("wall ")
+    if wall.shape[1] > 1:
+        sizes = wall.columns[-2:]
+        summary["exponent"] = (
+            np.log(wall[sizes[1]] / wall[sizes[0]]) / np.log(sizes[1] / sizes[0])
+        ).round(2)
+    peak = grouped["peak_memory"].unstack("size")
+    if peak.notna().any().any():
+        summary = summary.join((peak / 2**20).round(1).add_prefix("MB "))
+    return summary
+
+
+def compare(results: pd.DataFrame, baseline: pd.DataFrame) -> pd.DataFrame:
+    """
+    Ratio of every stage's wall time to the baseline's at the same size.
+    """
+
+    def totals(df: pd.DataFrame) -> pd.Series:
+        df = df.assign(stage=df["stage"].map(_render_stage))
+        return df.groupby(["stage", "size"], sort=False)["wall"].sum()
+
+    ratio = (totals(results) / totals(baseline)).dropna()
+    return ratio.unstack("size").round(2).add_prefix("x ")
+
+
+def plot(results: pd.DataFrame, output: str):
+    results = results.assign(stage=results["stage"].map(_render_stage))
+    wall = results.groupby(["size", "stage"], sort=False)["wall"].sum().unstack()
+    chart = LineChart(
+        title=os.path.splitext(os.path.basename(output))[0] + "_scaling",
+        data=wall,
+        plot_title="Wall seconds per stage by messages",
+        log=True,
+    )
+    chart.save(RenderOptions(directory=os.path.dirname(os.path.abspath(output))))
+
+
+def construct_argparser() -> ArgumentParser:
+    parser = ArgumentParser(description="time parsing and metrics on synthetic chats")
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=SIZES,
+        help="message counts to benchmark, up to 10000000",
+    )
+    parser.add_argument(
+        "--participants",
+        type=int,
+        default=ExportSpec.participants,
+        help="participants in every synthetic chat",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=ExportSpec.seed,
+        help="seed of the synthetic chats, keep it fixed to compare commits",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of workers used to parse message files",
+    )
+    parser.add_argument(
+        "--workdir",
+        type=str,
+        default=WORKDIR,
+        help="directory the synthetic exports and figures are written to",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="./benchmark.json",
+        help="JSON file to write the results to, with a scaling chart next to it",
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        help="results of an earlier run, e.g. on another commit, to compare against",
+    )
+    parser.add_argument(
+        "--no-trace",
+        action="store_true",
+        help="skip tracing peak memory, which slows every stage down",
+    )
+    return parser
+
+
+def main():
+    args = construct_argparser().parse_args()
+    if not args.no_trace:
+        profiler.start()
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    spec = ExportSpec(participants=args.participants, seed=args.seed)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)
+    setup()
+    rows: List[Dict] = []
+    for size in args.sizes:
+        sized = replace(spec, messages=size)
+        if ensure_export(sized, f"./messages/inbox/synthetic_{size}"):
+            print(f"generated {size} messages")
+        rows += [{"size": size, **asdict(t)} for t in bench_size(sized, args.jobs)]
+
+    results = pd.DataFrame(rows)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "commit": _commit(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "pandas": pd.__version__,
+                "spec": asdict(spec),
+                "traced": not args.no_trace,
+                "results": rows,
+            },
+            f,
+            indent=2,
+        )
+    plot(results, output)
+
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(summarize(results))
+        if baseline:
+            with open(baseline, encoding="utf-8") as f:
+                print(compare(results, pd.DataFrame(json.load(f)["results"])))
+    print(f"wrote results to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ingest.export import signature
+from ingest.table import MessageTable
+
+CACHE_DIR = "./.cache"
+FORMAT_VERSION = 2
+
+
+def fingerprint(paths: List[str]) -> str:
+    h = hashlib.sha1(f"v{FORMAT_VERSION}".encode())
+    for path in sorted(paths):
+        h.update(f"{signature(path)}\n".encode())
+    return h.hexdigest()
+
+
+def _encode_strings(values: List[str]) -> Tuple[np.ndarray, bytes]:
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+
+def _decode_strings(offsets: np.ndarray, blob: np.ndarray) -> np.ndarray:
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return np.array(
+        [
+            data[bounds[i] : bounds[i + 1]].decode("utf-8")
+            for i in range(len(bounds) - 1)
+        ],
+        dtype=object,
+    )
+
+
+def store(directory: str, key: str, table: MessageTable):
+    """
+    Writes the table's arrays as .npy files under directory/key. The content
+    dictionary is kept as one utf-8 blob plus offsets. Older entries for the
+    chat are removed.
+    """
+    tmp = os.path.join(directory, f"{key}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name in MessageTable.arrays():
+        np.save(os.path.join(tmp, f"{name}.npy"), getattr(table, name))
+    offsets, blob = _encode_strings(list(table.contents))
+    np.save(os.path.join(tmp, "dictionary_offsets.npy"), offsets)
+    with open(os.path.join(tmp, "dictionary.bin"), "wb") as f:
+        f.write(blob)
+    with open(os.path.join(tmp, "names.json"), "w", encoding="utf-8") as f:
+        json.dump({"names": list(table.names), "kinds": list(table.kinds)}, f)
+
+    for entry in os.listdir(directory):
+        if entry != f"{key}.tmp":
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    os.rename(tmp, os.path.join(directory, key))
+
+
+def load(directory: str, key: str) -> Optional[MessageTable]:
+    path = os.path.join(directory, key)
+    if not os.path.isdir(path):
+        return None
+
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in MessageTable.arrays()
+    }
+    with open(os.path.join(path, "names.json"), "r", encoding="utf-8") as f:
+        dictionaries = json.load(f)
+    blob_path = os.path.join(path, "dictionary.bin")
+    blob = (
+        np.memmap(blob_path, dtype=np.uint8, mode="r")
+        if os.path.getsize(blob_path)
+        else np.zeros(0, dtype=np.uint8)
+    )
+    contents = _decode_strings(
+        np.load(os.path.join(path, "dictionary_offsets.npy")), blob
+    )
+    return MessageTable(
+        names=np.array(dictionaries["names"], dtype=object),
+        contents=contents,
+        kinds=np.array(dictionaries["kinds"], dtype=object),
+        **arrays,
+    )
@@ -0,0 +1,243 @@
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from ingest import ragged
+from ingest.export import open_text, signature
+from ingest.stream import iter_messages
+from profiler import measure
+from status import Timing
+
+
+@dataclass(frozen=True)
+class MessageFilter:
+    """
+    Messages to keep while parsing: those sent from start until end, in ms
+    since the epoch with end excluded, and by one of participants, along
+    with only the reactions of participants. Unset bounds or participants
+    keep everything.
+    """
+
+    start: Optional[int] = None
+    end: Optional[int] = None
+    participants: Optional[FrozenSet[str]] = None
+
+    @cached_property
+    def names(self) -> Optional[FrozenSet[str]]:
+        # exports write names as utf-8 bytes decoded as latin-1, match both
+        if self.participants is None:
+            return None
+        encoded = {p.encode("utf-8").decode("latin-1") for p in self.participants}
+        return self.participants | encoded
+
+    @property
+    def windowed(self) -> bool:
+        return self.start is not None or self.end is not None
+
+
+class MessageColumns:
+    """
+    Column oriented buffers for a chat's messages. Senders and reactors are
+    interned into integer codes that index into names, reactions are stored
+    CSR style as a flat list of reactor codes plus per message offsets, with
+    the reaction itself (the emoji) interned into kinds alongside.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.sender = array("i")
+        self.timestamp = array("q")
+        self.content: List[Optional[str]] = []
+        self.photos = array("i")
+        self.react_offsets = array("q", [0])
+        self.reactors = array("i")
+        self.kinds: List[str] = []
+        self.reaction = array("i")
+        self._codes: Dict[str, int] = {}
+        self._kind_codes: Dict[str, int] = {}
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_codes"]
+        del state["_kind_codes"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._codes = {n: i for i, n in enumerate(self.names)}
+        self._kind_codes = {k: i for i, k in enumerate(self.kinds)}
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self._codes[name] = code
+            self.names.append(name)
+        return code
+
+    def kind(self, reaction: str) -> int:
+        code = self._kind_codes.get(reaction)
+        if code is None:
+            code = len(self.kinds)
+            self._kind_codes[reaction] = code
+            self.kinds.append(reaction)
+        return code
+
+    def append(self, msg: dict):
+        self.sender.append(self.code(msg["sender_name"]))
+        self.timestamp.append(msg["timestamp_ms"])
+        self.content.append(msg.get("content"))
+        self.photos.append(len(msg.get("photos", ())))
+        for r in msg.get("reactions", ()):
+            self.reactors.append(self.code(r["actor"]))
+            self.reaction.append(self.kind(r.get("reaction", "")))
+        self.react_offsets.append(len(self.reactors))
+
+    def extend(self, other: "MessageColumns", rows: Optional[np.ndarray] = None):
+        """
+        Appends the messages of other, or only the given rows of other in the
+        given order, remapping their sender, reactor and reaction codes.
+        """
+        mapping = np.array([self.code(n) for n in other.names], dtype=np.int32)
+        kinds = np.array([self.kind(k) for k in other.kinds], dtype=np.int32)
+        offsets = np.frombuffer(other.react_offsets, dtype=np.int64)
+        reactors = np.frombuffer(other.reactors, dtype=np.int32)
+        reaction = np.frombuffer(other.reaction, dtype=np.int32)
+        if rows is None:
+            self.sender.frombytes(_remap(mapping, other.sender))
+            self.timestamp.extend(other.timestamp)
+            self.content.extend(other.content)
+            self.photos.extend(other.photos)
+            lengths = np.diff(offsets)
+        else:
+            self.sender.frombytes(_remap(mapping, _take(other.sender, rows)))
+            self.timestamp.frombytes(_take(other.timestamp, rows).tobytes())
+            self.content.extend(other.content[i] for i in rows)
+            self.photos.frombytes(_take(other.photos, rows).tobytes())
+            lengths, reactors = ragged.gather(offsets, reactors, rows)
+            _, reaction = ragged.gather(offsets, reaction, rows)
+        base = self.react_offsets[-1]
+        self.react_offsets.frombytes((np.cumsum(lengths) + base).tobytes())
+        self.reactors.frombytes(_remap(mapping, reactors))
+        self.reaction.frombytes(_remap(kinds, reaction))
+
+
+def _take(values: array, rows: np.ndarray) -> np.ndarray:
+    return np.frombuffer(values, dtype=values.typecode)[rows]
+
+
+def _remap(mapping: np.ndarray, codes) -> bytes:
+    if not len(codes):
+        return b""
+    return mapping[np.asarray(codes, dtype=np.int32)].astype(np.int32).tobytes()
+
+
+def read_columns(path: str, where: Optional[MessageFilter] = None) -> MessageColumns:
+    """
+    Reads the messages of one file, keeping only those where selects when
+    it is given. Exports list messages newest first, so reading stops at
+    the first message older than the window once the file is seen to be
+    in that order, that is once a message was older than the one before
+    it and none was newer.
+    """
+    columns = MessageColumns()
+    where = where or MessageFilter()
+    start, end, names = where.start, where.end, where.names
+    older = newer = False
+    previous = None
+    for msg in iter_messages(path):
+        timestamp = msg["timestamp_ms"]
+        if previous is not None:
+            older |= timestamp < previous
+            newer |= timestamp > previous
+        previous = timestamp
+        if start is not None and timestamp < start:
+            if older and not newer:
+                break
+            continue
+        if end is not None and timestamp >= end:
+            continue
+        if names is not None:
+            if msg["sender_name"] not in names:
+                continue
+            if "reactions" in msg:
+                reactions = [r for r in msg["reactions"] if r["actor"] in names]
+                msg["reactions"] = reactions
+        columns.append(msg)
+    return columns
+
+
+# keys are escaped within JSON strings, so this only matches message fields
+TIMESTAMP = re.compile(r'"timestamp_ms"\s*:\s*(-?\d+)')
+
+
+@lru_cache(maxsize=1024)
+def _span(path: str, version: str) -> Optional[Tuple[int, int]]:
+    # scanned once per version of the file, as given by its signature
+    with open_text(path) as f:
+        timestamps = [int(t) for t in TIMESTAMP.findall(f.read())]
+    if not timestamps:
+        return None
+    return min(timestamps), max(timestamps)
+
+
+def prune_files(paths: List[str], where: MessageFilter) -> List[str]:
+    """
+    Drops the message files that hold no message in the window of where
+    without parsing them. The oldest and newest message of every file are
+    found by scanning it for timestamps, which is much cheaper than decoding
+    its messages and makes no assumption on the order messages are in.
+    """
+    if not where.windowed:
+        return paths
+    kept = []
+    for path in paths:
+        span = _span(path, signature(path))
+        if span is None:
+            continue
+        oldest, newest = span
+        if where.start is not None and newest < where.start:
+            continue
+        if where.end is not None and oldest >= where.end:
+            continue
+        kept.append(path)
+    return kept
+
+
+def _parse_file(
+    path: str, where: Optional[MessageFilter] = None
+) -> Tuple[MessageColumns, Timing]:
+    print(f"parsing {path}")
+    with measure(f"parse {path}") as timing:
+        columns = read_columns(path, where)
+        timing.rows = len(columns)
+    return columns, timing
+
+
+def read_files(
+    paths: List[str],
+    jobs: int = 1,
+    where: Optional[MessageFilter] = None,
+    timings: Optional[List[Timing]] = None,
+) -> List[MessageColumns]:
+    """
+    Reads every file, on a pool of processes when jobs > 1, keeping only
+    the messages where selects. The time taken by each file is appended to
+    timings when given.
+    """
+    if jobs <= 1 or len(paths) <= 1:
+        parsed = [_parse_file(p, where) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as pool:
+            parsed = list(pool.map(_parse_file, paths, [where] * len(paths)))
+    if timings is not None:
+        timings.extend(timing for _, timing in parsed)
+    return [columns for columns, _ in parsed]
@@ -0,0 +1,132 @@
+import io
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+from zipfile import ZipFile
+
+# message files of a chat, wherever the inbox is nested within the export
+MESSAGE_FILE = re.compile(r"(?:^|/)inbox/([^/]+)/message_(\d+)\.json$")
+FILE_NUMBER = re.compile(r"message_(\d+)\.json$")
+ZIP_EXTENSION = ".zip"
+
+
+@lru_cache(maxsize=16)
+def _open_archive(path: str, size: int, mtime: int, pid: int) -> ZipFile:
+    return ZipFile(path)
+
+
+def _archive(path: str) -> ZipFile:
+    # opened once per process, since forked workers must not share the file
+    # offset of their parent's handle, and again once the archive is replaced
+    st = os.stat(path)
+    return _open_archive(os.path.abspath(path), st.st_size, st.st_mtime_ns, os.getpid())
+
+
+def file_number(path: str) -> int:
+    """
+    N of a message_N.json file, 1 being the file with the newest messages.
+    """
+    match = FILE_NUMBER.search(path)
+    return int(match.group(1)) if match else 0
+
+
+def split_member(path: str) -> Tuple[str, Optional[str]]:
+    """
+    Message files inside a zip archive are addressed like zipimport does,
+    by the archive's path followed by the member's name. Returns the
+    archive and member of such a path, or the path itself and None for a
+    plain file.
+    """
+    start = 0
+    while True:
+        end = path.find(ZIP_EXTENSION + "/", start)
+        if end < 0:
+            return path, None
+        archive = path[: end + len(ZIP_EXTENSION)]
+        if os.path.isfile(archive):
+            return archive, path[len(archive) + 1 :]
+        start = end + 1
+
+
+def open_text(path: str) -> TextIO:
+    """
+    Opens a message file for reading, streaming it out of its archive
+    without extracting it when it is a member of one.
+    """
+    archive, member = split_member(path)
+    if member is None:
+        return open(path, "r", encoding="utf-8")
+    return io.TextIOWrapper(_archive(archive).open(member), encoding="utf-8")
+
+
+def signature(path: str) -> str:
+    """
+    String that changes whenever the message file does, for cache keys.
+    """
+    archive, member = split_member(path)
+    if member is None:
+        st = os.stat(path)
+        return f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    info = _archive(archive).getinfo(member)
+    return f"{os.path.abspath(archive)}/{member}:{info.file_size}:{info.CRC}"
+
+
+def _message_files(source: str) -> Iterator[Tuple[str, int, str]]:
+    """
+    Yields the chat, number and path of every message file in an export.
+    """
+    if os.path.isfile(source):
+        names: Iterable[str] = _archive(source).namelist()
+        root = source
+    elif os.path.isdir(source):
+        # relative to the parent, so that an inbox directory given directly
+        # still matches inbox/<chat>/
+        root = os.path.dirname(os.path.normpath(source))
+        names = (
+            os.path.relpath(os.path.join(directory, f), root)
+            for directory, _, files in os.walk(source)
+            for f in files
+        )
+    else:
+        raise Exception(f"No export found at {source}")
+    for name in names:
+        match = MESSAGE_FILE.search(name.replace(os.sep, "/"))
+        if match:
+            yield match.group(1), int(match.group(2)), os.path.join(root, name)
+
+
+class Inbox:
+    """
+    Index of the message files of every chat across Facebook exports, each
+    a zip archive as downloaded or a directory it was unpacked to. Building
+    it only lists the archives' members, a chat's files are read when that
+    chat is parsed. Large exports come split over several archives, a chat
+    may have its files spread across them.
+    """
+
+    def __init__(self, chats: Dict[str, List[str]]):
+        self.chats = chats
+
+    @classmethod
+    def index(cls, sources: List[str]) -> "Inbox":
+        found: Dict[str, Dict[int, str]] = {}
+        for source in sources:
+            for chat, number, path in _message_files(source):
+                # the first export listing a file wins over later copies
+                found.setdefault(chat, {}).setdefault(number, path)
+        return cls(
+            {
+                chat: [files[n] for n in sorted(files)]
+                for chat, files in sorted(found.items())
+            }
+        )
+
+    def __len__(self) -> int:
+        return len(self.chats)
+
+    def names(self) -> List[str]:
+        return list(self.chats)
+
+    def subset(self, chats: List[str]) -> "Inbox":
+        return Inbox({c: self.chats[c] for c in chats})
@@ -0,0 +1,66 @@
+import heapq
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from ingest.columns import MessageColumns
+
+
+def _ascending_rows(part: MessageColumns) -> np.ndarray:
+    ts = np.frombuffer(part.timestamp, dtype=np.int64)
+    if len(ts) < 2 or ts[0] <= ts[-1] and np.all(ts[1:] >= ts[:-1]):
+        return np.arange(len(ts))
+    if np.all(ts[1:] <= ts[:-1]):
+        return np.arange(len(ts) - 1, -1, -1)
+    return np.argsort(ts, kind="stable")
+
+
+def _tagged(
+    i: int, part: MessageColumns, rows: np.ndarray
+) -> Iterator[Tuple[int, int, int, int]]:
+    ts = np.frombuffer(part.timestamp, dtype=np.int64)[rows]
+    for pos, (t, row) in enumerate(zip(ts.tolist(), rows.tolist())):
+        yield t, i, pos, row
+
+
+def _heap_merge(
+    runs: List[Tuple[MessageColumns, np.ndarray]],
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    k-way merges overlapping runs, yielding (run index, rows) segments of
+    consecutive output rows that come from the same run.
+    """
+    streams = [_tagged(i, part, rows) for i, (part, rows) in enumerate(runs)]
+    current, segment = -1, []
+    for _, i, _, row in heapq.merge(*streams):
+        if i != current and segment:
+            yield current, np.array(segment, dtype=np.int64)
+            segment = []
+        current = i
+        segment.append(row)
+    if segment:
+        yield current, np.array(segment, dtype=np.int64)
+
+
+def merge_columns(parts: List[MessageColumns]) -> MessageColumns:
+    """
+    Merges the parsed message files into a single chronologically ordered
+    set of columns. Export files are each sorted newest first and usually
+    cover disjoint time ranges, so ordering the files by their time range and
+    reversing each one is enough, only overlapping files fall back to a heap
+    merge.
+    """
+    runs = [(p, _ascending_rows(p)) for p in parts if len(p)]
+    runs.sort(key=lambda r: r[0].timestamp[r[1][0]])
+
+    bounds = [(p.timestamp[rows[0]], p.timestamp[rows[-1]]) for p, rows in runs]
+    disjoint = all(bounds[i][1] <= bounds[i + 1][0] for i in range(len(bounds) - 1))
+
+    merged = MessageColumns()
+    if disjoint:
+        for part, rows in runs:
+            merged.extend(part, rows)
+    else:
+        for i, rows in _heap_merge(runs):
+            merged.extend(runs[i][0], rows)
+    return merged
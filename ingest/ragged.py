@@ -0,0 +1,17 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def gather(
+    offsets: np.ndarray, values: np.ndarray, rows: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Selects the given rows, in order, out of a CSR encoded ragged array where
+    row i is values[offsets[i] : offsets[i + 1]]. Returns the selected row
+    lengths and their concatenated values.
+    """
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return lengths, values[shift + np.arange(lengths.sum(), dtype=np.int64)]
@@ -0,0 +1,106 @@
+import json
+from typing import Any, Iterator, TextIO, Tuple
+
+from ingest.export import open_text
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = " \t\n\r"
+
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    def __init__(self, f: TextIO, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def expect(self, token: str):
+        if self.peek() != token:
+            raise ValueError(f"Expected '{token}' at offset {self.pos}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # a number may be cut off at the chunk boundary
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def _iter_array(reader: _Reader) -> Iterator[Any]:
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.peek() == ",":
+            reader.pos += 1
+            continue
+        reader.expect("]")
+        return
+
+
+def iter_fields(
+    f: TextIO, stream_key: str, chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Incrementally walks the top level object of a JSON document, yielding
+    (key, value) pairs. The array under stream_key is not materialized, it is
+    yielded as a (stream_key, element) pair for every element instead.
+    """
+    reader = _Reader(f, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == stream_key and reader.peek() == "[":
+            for item in _iter_array(reader):
+                yield key, item
+        else:
+            yield key, reader.value()
+        if reader.peek() == ",":
+            reader.pos += 1
+            continue
+        reader.expect("}")
+        return
+
+
+def iter_messages(path: str) -> Iterator[dict]:
+    with open_text(path) as f:
+        for key, value in iter_fields(f, "messages"):
+            if key == "messages":
+                yield value
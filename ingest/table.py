@@ -0,0 +1,83 @@
+from dataclasses import dataclass, fields
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ingest.columns import MessageColumns
+
+
+@dataclass(frozen=True)
+class MessageTable:
+    """
+    Chronologically ordered, read only message table. Senders and reactors
+    are codes into names, content is a code into contents (-1 when the
+    message has no text) and reactions are CSR encoded: the reactors of
+    message i are reactors[react_offsets[i] : react_offsets[i + 1]], and
+    reaction holds the matching codes into kinds (the reaction emoji).
+    """
+
+    DICTIONARIES = ("names", "contents", "kinds")
+
+    names: np.ndarray
+    contents: np.ndarray
+    kinds: np.ndarray
+    sender: np.ndarray
+    timestamp: np.ndarray
+    content: np.ndarray
+    photos: np.ndarray
+    react_offsets: np.ndarray
+    reactors: np.ndarray
+    reaction: np.ndarray
+
+    @classmethod
+    def arrays(cls) -> List[str]:
+        return [f.name for f in fields(cls) if f.name not in cls.DICTIONARIES]
+
+    @classmethod
+    def from_columns(cls, columns: MessageColumns) -> "MessageTable":
+        codes, uniques = pd.factorize(pd.Series(columns.content, dtype=object))
+        return cls(
+            names=np.array(columns.names, dtype=object),
+            contents=np.asarray(uniques, dtype=object),
+            kinds=np.array(columns.kinds, dtype=object),
+            sender=np.asarray(columns.sender, dtype=np.int32),
+            timestamp=np.asarray(columns.timestamp, dtype=np.int64),
+            content=codes.astype(np.int32),
+            photos=np.asarray(columns.photos, dtype=np.int32),
+            react_offsets=np.asarray(columns.react_offsets, dtype=np.int64),
+            reactors=np.asarray(columns.reactors, dtype=np.int32),
+            reaction=np.asarray(columns.reaction, dtype=np.int32),
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    @property
+    def react_counts(self) -> np.ndarray:
+        return np.diff(self.react_offsets)
+
+    def reactions(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns aligned (reactor, sender) code arrays with one entry per
+        reaction.
+        """
+        return self.reactors, np.repeat(self.sender, self.react_counts)
+
+    def sender_names(self) -> np.ndarray:
+        return self.names[self.sender]
+
+    def content_values(self) -> np.ndarray:
+        # missing content is coded -1, which picks the trailing None
+        return np.append(self.contents, None)[self.content]
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "sender": pd.Categorical.from_codes(self.sender, self.names),
+                "timestamp": self.timestamp,
+                "content": pd.Categorical.from_codes(self.content, self.contents),
+                "photos": self.photos,
+                "reacts": self.react_counts,
+            }
+        )
@@ -1,74 +1,130 @@
-from typing import List
+from typing import List, Optional
 
+import numpy as np
 import pandas as pd
 
-from metrics.figure import Chart, Figure
+from metrics.context import ChatContext
+from metrics.figure import Chart, Figure, LineChart
 from metrics.metric import Metric
+from metrics.options import MetricOptions
 
 
 class CumulativeActivity(Metric):
+    OPTIONS = ("filter_top", "filter_bottom", "cumulative_resolution")
     name = "cumulative_activity"
 
-    def __init__(self, messages: pd.DataFrame, filter_top: bool, filter_bottom: bool):
-        super().__init__(messages)
+    def __init__(
+        self,
+        context: ChatContext,
+        filter_top: bool,
+        filter_bottom: bool,
+        resolution: Optional[str] = None,
+    ):
+        super().__init__(context)
         self.filter_top = filter_top
         self.filter_bottom = filter_bottom
+        self.resolution = resolution
 
-    def compute_metric(self) -> List[Figure]:
-        participants = self.get_participants()
-        counter = {p: 0 for p in participants}
-
-        rows = []
-        for row in self.messages.itertuples():
-            counter[row.sender] += 1
-            entry = counter.copy()
-            entry["date"] = self.timestamp_to_date(row.timestamp)
-            rows.append(entry)
+    @classmethod
+    def from_options(
+        cls, context: ChatContext, options: MetricOptions
+    ) -> "CumulativeActivity":
+        return cls(
+            context,
+            options.filter_top,
+            options.filter_bottom,
+            options.cumulative_resolution,
+        )
 
-        df = pd.DataFrame(rows)
+    def compute_metric(self) -> List[Figure]:
+        senders = self.context.participants
+        df = self._cumulative_counts()
 
-        senders = self._get_sorted_senders(df)
         charts = [self._plot_cumulative_all(df, senders)]
-        mid = int(len(participants) / 2)
+        mid = int(len(senders) / 2)
         if self.filter_top:
             charts.append(self._plot_cumulative_top(df, senders, mid))
         if self.filter_bottom:
             charts.append(self._plot_cumulative_bottom(df, senders, mid))
         return charts
 
+    def _cumulative_counts(self) -> pd.DataFrame:
+        """
+        Running total of messages sent by each participant, with one row per
+        message or, when a resolution is set, one row per non empty time
+        bucket. Without the messages, e.g. after an incremental update, the
+        state's hourly counts are used and the resolution is at least an hour.
+        """
+        n_senders = len(self.context.participants)
+        if self.messages is None:
+            times = self.context.hours
+            senders = self.state.hour_sender
+            weights = self.state.hour_count
+        else:
+            times = self.context.datetimes
+            senders = self.messages.sender
+            weights = None
+        positions = self.context.participant_positions[senders]
+
+        if self.resolution is None and self.messages is not None:
+            # a running count per participant, built column by column rather
+            # than by summing up a one-hot row for every message
+            dates = times
+            df = pd.DataFrame(
+                {
+                    p: np.cumsum(positions == i, dtype=np.int32)
+                    for i, p in enumerate(self.context.participants)
+                },
+                columns=self.context.participants,
+            )
+        else:
+            # times are sorted, so bucket codes come out in order too
+            buckets, dates = pd.factorize(
+                times.floor(self.resolution or "h"), sort=True
+            )
+            counts = np.bincount(
+                buckets * n_senders + positions,
+                weights=weights,
+                minlength=len(dates) * n_senders,
+            )
+            counts = counts.astype(np.int64).reshape(len(dates), n_senders)
+            np.cumsum(counts, axis=0, out=counts)
+            df = pd.DataFrame(counts, columns=self.context.participants)
+
+        df["date"] = dates
+        return df
+
     def _plot_cumulative_all(
         self,
         df: pd.DataFrame,
         senders: List[str],
     ) -> Chart:
-        plt = df.plot(
+        return LineChart(
+            title="cumulative_activity_all",
+            data=df,
+            plot_title="Cumulative sum of messages sent by all chatters",
             x="date",
             y=senders,
-            title="Cumulative sum of messages sent by all chatters",
         )
-        return Chart(title="cumulative_activity_all", figure=plt.get_figure())
 
     def _plot_cumulative_top(
         self, df: pd.DataFrame, senders: List[str], n: int
     ) -> Chart:
-        plt = df.plot(
+        return LineChart(
+            title="cumulative_activity_top",
+            data=df,
+            plot_title=f"Cumulative sum of messages sent over time by top {n} chatters",
             x="date",
             y=senders[:n],
-            title=f"Cumulative sum of messages sent over time by top {n} chatters",
         )
-        return Chart(title="cumulative_activity_top", figure=plt.get_figure())
 
     def _plot_cumulative_bottom(
         self, df: pd.DataFrame, senders: List[str], n: int
     ) -> Chart:
-        plt = df.plot(
+        return LineChart(
+            title="cumulative_activity_bottom",
+            data=df,
+            plot_title=f"Cumulative sum of messages sent over time by bottom {n} chatters",
             x="date",
             y=senders[n:],
-            title=f"Cumulative sum of messages sent over time by bottom {n} chatters",
         )
-        return Chart(title="cumulative_activity_bottom", figure=plt.get_figure())
-
-    def _get_sorted_senders(self, df: pd.DataFrame) -> List[str]:
-        sender_counts = [(df[c].iloc[-1], c) for c in df.columns if c != "date"]
-        sender_counts.sort(key=lambda x: x[0], reverse=True)
-        return [sc[1] for sc in sender_counts]
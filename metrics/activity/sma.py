@@ -1,81 +1,82 @@
-from typing import List
+from typing import Dict, List
 
+import numpy as np
 import pandas as pd
 
-from metrics.figure import Chart, Figure
+from metrics.context import ChatContext
+from metrics.figure import Chart, Figure, LineChart
 from metrics.metric import Metric
+from metrics.options import MetricOptions
 
 
 class SmaActivity(Metric):
+    OPTIONS = ("filter_top", "filter_bottom", "windows")
     name = "sma_activity"
 
     def __init__(
-        self, messages: pd.DataFrame, filter_top: bool, filter_bottom: bool, window: int
+        self,
+        context: ChatContext,
+        filter_top: bool,
+        filter_bottom: bool,
+        windows: List[int],
     ):
-        super().__init__(messages)
+        super().__init__(context)
         self.filter_top = filter_top
         self.filter_bottom = filter_bottom
-        self.window = window
+        self.windows = windows
 
-    def compute_metric(self) -> List[Figure]:
-        participants = self.get_participants()
-
-        dfs = []
-        for p in participants:
-            p_df = self.messages[self.messages.sender == p]
-            p_df["date"] = self.messages["timestamp"].apply(self.timestamp_to_date)
-            date_df = pd.to_datetime(p_df["date"])
-            count_df = date_df.groupby(date_df.dt.floor("d")).size().reset_index(name=p)
-            count_df[p] = count_df[p].rolling(window=self.window).mean()
-            count_df.set_index("date", inplace=True)
-            dfs.append(count_df)
+    @classmethod
+    def from_options(
+        cls, context: ChatContext, options: MetricOptions
+    ) -> "SmaActivity":
+        return cls(context, options.filter_top, options.filter_bottom, options.windows)
 
-        dfs = self._sort_dfs(dfs)
-
-        charts = [self._plot_sma_all(dfs)]
-        mid = int(len(participants) / 2)
-        if self.filter_top:
-            charts.append(self._plot_sma_top(dfs, mid))
-        if self.filter_bottom:
-            charts.append(self._plot_sma_bottom(dfs, mid))
+    def compute_metric(self) -> List[Figure]:
+        senders = self.context.participants
+        mid = int(len(senders) / 2)
+
+        charts = []
+        for window, df in self._rolling_means().items():
+            suffix = "" if len(self.windows) == 1 else f"_{window}d"
+            charts.append(self._plot_sma(df, senders, window, "all", suffix))
+            if self.filter_top:
+                charts.append(self._plot_sma(df, senders[:mid], window, "top", suffix))
+            if self.filter_bottom:
+                charts.append(
+                    self._plot_sma(df, senders[mid:], window, "bottom", suffix)
+                )
         return charts
 
-    def _plot_sma_all(self, dfs: List[pd.DataFrame]) -> Chart:
-        ax = dfs[0].plot(
-            title=f"Moving Avg of messages sent per day on a {self.window} day window for all chatters"
-        )
-        for i in range(1, len(dfs)):
-            dfs[i].plot(ax=ax)
-
-        return Chart(title="sma_activity_all", figure=ax.get_figure())
-
-    def _plot_sma_top(self, dfs: List[pd.DataFrame], n: int) -> Chart:
-        dfs = self._copy_dfs(dfs[:n])
-        ax = dfs[0].plot(
-            title=f"Moving Avg of messages sent per day on a {self.window} day window for top chatters"
+    def _rolling_means(self) -> Dict[int, pd.DataFrame]:
+        """
+        Moving average of messages per calendar day for every participant and
+        window. All windows are differences over one shared prefix sum of the
+        day x sender count matrix.
+        """
+        counts = self.context.calendar_counts
+        prefix = np.zeros((len(counts) + 1, counts.shape[1]), dtype=np.int64)
+        np.cumsum(counts.to_numpy(), axis=0, out=prefix[1:])
+
+        means = {}
+        for window in self.windows:
+            values = np.full(counts.shape, np.nan)
+            if window <= len(counts):
+                values[window - 1 :] = (prefix[window:] - prefix[:-window]) / window
+            means[window] = pd.DataFrame(
+                values, index=counts.index, columns=counts.columns
+            )
+        return means
+
+    def _plot_sma(
+        self,
+        df: pd.DataFrame,
+        senders: List[str],
+        window: int,
+        group: str,
+        suffix: str,
+    ) -> Chart:
+        return LineChart(
+            title=f"sma_activity_{group}{suffix}",
+            data=df[senders],
+            plot_title=f"Moving Avg of messages sent per day on a {window} day window for {group} chatters",
         )
-        for i in range(1, len(dfs)):
-            dfs[i].plot(ax=ax)
-
-        return Chart(title="sma_activity_top", figure=ax.get_figure())
-
-    def _plot_sma_bottom(self, dfs: List[pd.DataFrame], n: int) -> Chart:
-        dfs = self._copy_dfs(dfs[n:])
-        ax = dfs[0].plot(
-            title=f"Moving Avg of messages sent per day on a {self.window} day window for bottom chatters"
-        )
-        for i in range(1, len(dfs)):
-            dfs[i].plot(ax=ax)
-
-        return Chart(title="sma_activity_bottom", figure=ax.get_figure())
-
-    def _copy_dfs(self, dfs: List[pd.DataFrame]) -> List[pd.DataFrame]:
-        return [df.copy(deep=True) for df in dfs]
-
-    def _sort_dfs(self, dfs: List[pd.DataFrame]) -> List[pd.DataFrame]:
-        sender_counts = []
-        for df in dfs:
-            name = [c for c in df.columns][0]
-            sender_counts.append((df[name].sum(), df))
-        sender_counts.sort(key=lambda x: x[0], reverse=True)
-        return [sc[1] for sc in sender_counts]
@@ -1,30 +1,19 @@
-from dataclasses import dataclass, field
-from typing import Dict, List
+import re
+from typing import List, Tuple
 
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 
+from metrics.context import ChatContext
 from metrics.figure import Figure, Table
 from metrics.metric import Metric
-
-
-@dataclass
-class MessageCount:
-    message: str = ""
-    total: int = 0
-    counts: Dict[str, int] = field(default_factory=dict)
-
-
-@dataclass(frozen=True)
-class ReactedMessage:
-    message: str
-    sender: str
-    reacts: int
+from metrics.options import MetricOptions
 
 
 class MessageAwards(Metric):
-    TOP_COMMON = 100
-    TOP_REACTED = 50
+    OPTIONS = ("top_common", "top_reacted")
+    TOP_COMMON = MetricOptions.top_common
+    TOP_REACTED = MetricOptions.top_reacted
     BLACKLIST = {
         "the call",
         "started a call",
@@ -34,85 +23,95 @@ class MessageAwards(Metric):
         "changed the group photo",
         "to your message",
     }
+    BLACKLIST_PATTERN = re.compile("|".join(re.escape(p) for p in sorted(BLACKLIST)))
 
     name = "message_awards"
 
-    def __init__(self, messages: pd.DataFrame):
-        super().__init__(messages)
+    def __init__(
+        self,
+        context: ChatContext,
+        top_common: int = TOP_COMMON,
+        top_reacted: int = TOP_REACTED,
+    ):
+        super().__init__(context)
+        self.top_common = top_common
+        self.top_reacted = top_reacted
+
+    @classmethod
+    def from_options(
+        cls, context: ChatContext, options: MetricOptions
+    ) -> "MessageAwards":
+        return cls(context, options.top_common, options.top_reacted)
 
     def compute_metric(self) -> List[Figure]:
-        return [self._most_common_messages(), self._most_reacted_messages()]
-
-    def _most_common_messages(self) -> Table:
-        message_counts = self._generate_message_counts()
-
-        unique_senders = {
-            sender for message in message_counts for sender in message.counts.keys()
-        }
-        senders = list(unique_senders)
-
-        rows = []
-        for message in message_counts:
-            row = {"Message": message.message, "Total Count": message.total}
-            for s in senders:
-                row[s] = message.counts.get(s, 0)
-            rows.append(row)
+        lowered, blacklisted = self._normalize_contents()
+        return [
+            self._most_common_messages(lowered, blacklisted),
+            self._most_reacted_messages(blacklisted),
+        ]
 
-        row_labels = [str(i + 1) for i in range(self.TOP_COMMON)]
-        df = pd.DataFrame(rows, index=row_labels)
+    def _normalize_contents(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Works on the content dictionary rather than on messages. Returns, for
+        every content code, a code shared by all texts that are equal once
+        lowercased, and whether the text contains a blacklisted phrase.
+        """
+        lower = pd.Series(self.state.contents, dtype=object).str.lower()
+        lowered, _ = pd.factorize(lower)
+        blacklisted = lower.str.contains(self.BLACKLIST_PATTERN).to_numpy(dtype=bool)
+        return lowered, blacklisted
+
+    def _most_common_messages(
+        self, lowered: np.ndarray, blacklisted: np.ndarray
+    ) -> Table:
+        counts = self.context.content_counts
+        counts = counts[~blacklisted[counts["content"].to_numpy()]]
+        per_sender = (
+            counts.assign(message=lowered[counts["content"].to_numpy()])
+            .groupby(["message", "sender"])["count"]
+            .sum()
+            .unstack(fill_value=0)
+        )
+        totals = per_sender.sum(axis=1).nlargest(self.top_common, keep="first")
+        per_sender = per_sender.loc[totals.index]
+
+        # label each message with its most recent spelling
+        last = self.state.content_last
+        order = np.argsort(last, kind="stable")
+        latest = pd.Series(order).groupby(lowered[order]).last()
+
+        participants = self.context.participants
+        df = pd.DataFrame(
+            {
+                "Message": self.state.contents[latest[totals.index].to_numpy()],
+                "Total Count": totals.to_numpy(),
+            }
+        )
+        for position in per_sender.columns:
+            df[participants[position]] = per_sender[position].to_numpy()
+        df.index = [str(i + 1) for i in range(len(df))]
         df = self._strip_infrequent_chatters(df)
 
         return Table(title="most_common_messages", table=df)
 
-    def _most_reacted_messages(self) -> Table:
-        rows = [
-            {
-                "Message": message.message,
-                "Reacts": message.reacts,
-                "Sender": message.sender,
-            }
-            for message in self._generate_reacted_messages()
-        ]
+    def _most_reacted_messages(self, blacklisted: np.ndarray) -> Table:
+        # candidates are the state's most reacted messages, oldest first
+        content = self.state.reacted_content
+        reacts = pd.Series(self.state.reacted_count)
+        eligible = ~blacklisted[content]
+        top = reacts[eligible].nlargest(self.top_reacted, keep="first").index
 
-        row_labels = [str(i + 1) for i in range(self.TOP_REACTED)]
-        df = pd.DataFrame(rows, index=row_labels)
+        df = pd.DataFrame(
+            {
+                "Message": self.state.contents[content[top]],
+                "Reacts": reacts[top].to_numpy(),
+                "Sender": self.state.names[self.state.reacted_sender[top]],
+            },
+            index=[str(i + 1) for i in range(len(top))],
+        )
 
         return Table(title="most_reacted_messages", table=df)
 
-    def _generate_message_counts(self) -> List[MessageCount]:
-        counts = {}
-
-        for row in self.messages.itertuples():
-            if not isinstance(row.content, str):
-                continue
-
-            msg = row.content.lower()
-            if any(phrase in msg for phrase in self.BLACKLIST):
-                continue
-
-            if msg not in counts:
-                counts[msg] = MessageCount()
-            mc = counts[msg]
-            mc.message = row.content
-            mc.total += 1
-            if row.sender not in mc.counts:
-                mc.counts[row.sender] = 0
-            mc.counts[row.sender] += 1
-
-        message_counts = sorted(counts.values(), key=lambda c: c.total, reverse=True)
-        return message_counts[: min(len(message_counts), self.TOP_COMMON)]
-
-    def _generate_reacted_messages(self) -> List[ReactedMessage]:
-        reacted_messages = [
-            ReactedMessage(row.content, row.sender, len(row.reactors))
-            for row in self.messages.itertuples()
-            if isinstance(row.reactors, list)
-            and isinstance(row.content, str)
-            and all(phrase not in row.content.lower() for phrase in self.BLACKLIST)
-        ]
-        reacted_messages.sort(key=lambda m: m.reacts, reverse=True)
-        return reacted_messages[: min(len(reacted_messages), self.TOP_REACTED)]
-
     def _strip_infrequent_chatters(self, df: pd.DataFrame) -> pd.DataFrame:
         for col in df.columns:
             if df[col].dtype == int and df[col].sum() < 10:
@@ -1,71 +1,140 @@
-from dataclasses import dataclass
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 import numpy as np
 import pandas as pd
 
+from ingest import ragged
+from metrics.context import ChatContext
 from metrics.figure import Figure, Table
 from metrics.metric import Metric
-
-
-@dataclass
-class SenderCount:
-    date: np.dtype("datetime64[ns]")
-    sender: str
-    count: int
+from metrics.options import MetricOptions
+from metrics.text.mentions import MentionMatcher
+from metrics.text.scan import scan_words
 
 
 class SenderAwards(Metric):
+    OPTIONS = ("filter_words", "nicknames", "activity_buckets")
     TOP = 10
 
     name = "sender_awards"
 
-    def __init__(self, messages: pd.DataFrame, filter_word: Optional[str]):
-        super().__init__(messages)
-        self.filter_word = filter_word
+    def __init__(
+        self,
+        context: ChatContext,
+        filter_words: List[str],
+        nicknames: Optional[Dict[str, List[str]]] = None,
+        buckets: Optional[List[str]] = None,
+    ):
+        super().__init__(context)
+        self.filter_words = filter_words
+        self.nicknames = nicknames or {}
+        self.buckets = buckets or ["day"]
+
+    @classmethod
+    def from_options(
+        cls, context: ChatContext, options: MetricOptions
+    ) -> "SenderAwards":
+        return cls(
+            context,
+            options.filter_words,
+            options.nicknames,
+            options.activity_buckets,
+        )
 
     def compute_metric(self) -> List[Figure]:
-        figures = [self._most_chats_per_day(), self._most_mentioned()]
-        if self.filter_word:
-            figures.append(self._most_filter_word())
-        return figures
-
-    def _most_chats_per_day(self) -> Table:
-        participants = self.get_participants()
-        dfs = []
-        for p in participants:
-            p_df = self.messages[self.messages.sender == p]
-            p_df["date"] = self.messages["timestamp"].apply(self.timestamp_to_date)
-            date_df = pd.to_datetime(p_df["date"])
-            count_df = date_df.groupby(date_df.dt.floor("d")).size().reset_index(name=p)
-            count_df.set_index("date", inplace=True)
-            dfs.append(count_df)
-
-        counts = []
-        for df in dfs:
-            for index, row in df.iterrows():
-                name = [c for c in df.columns][0]
-                counts.append(SenderCount(date=index, sender=name, count=row[name]))
-        counts.sort(key=lambda c: c.count, reverse=True)
-
-        rows = [
-            {"Sender": c.sender, "Messages": c.count, "Date": c.date}
-            for c in counts[: self.TOP]
+        mentions = self._mention_matrix()
+        figures = [self._most_chats_per_bucket(b) for b in self.buckets]
+        figures += [
+            self._longest_streaks(),
+            self._most_mentioned(mentions),
+            Table("mentions_by_chatter", table=mentions),
         ]
-        row_labels = [str(i + 1) for i in range(self.TOP)]
-        df = pd.DataFrame(rows, index=row_labels)
-
-        return Table("most_messages_sent_on_a_single_day", table=df)
-
-    def _most_mentioned(self) -> Table:
-        participants = self.get_participants()
-        counts = {p: 0 for p in participants}
-        for row in self.messages.itertuples():
-            for p in participants:
-                if isinstance(row.content, str) and p in row.content:
-                    counts[p] += 1
+        if self.filter_words:
+            filtered = scan_words(self.context, self.filter_words, 0).filtered
+            figures.extend(
+                self._most_filter_word(w, filtered[w]) for w in self.filter_words
+            )
+        return figures
 
-        mentions = [(k, v) for k, v in counts.items()]
+    def _most_chats_per_bucket(self, bucket: str) -> Table:
+        counts = self.context.bucket_counts(bucket)
+        flat = counts.to_numpy().ravel()
+        k = min(self.TOP, int(np.count_nonzero(flat)))
+        top = np.argpartition(-flat, k - 1)[:k] if k else np.array([], dtype=int)
+        # highest count first, earliest bucket first among ties
+        top = top[np.lexsort((top, -flat[top]))]
+        rows, cols = np.divmod(top, counts.shape[1])
+
+        df = pd.DataFrame(
+            {
+                "Sender": counts.columns[cols],
+                "Messages": flat[top],
+                "Date": counts.index[rows],
+            },
+            index=[str(i + 1) for i in range(k)],
+        )
+
+        title = "on_a_single_day" if bucket == "day" else f"in_a_single_{bucket}"
+        return Table(f"most_messages_sent_{title}", table=df)
+
+    def _longest_streaks(self) -> Table:
+        """
+        Longest run of consecutive calendar days each chatter sent a message
+        on, found by run length encoding the active day matrix.
+        """
+        counts = self.context.calendar_counts
+        active = np.pad(counts.to_numpy().T > 0, ((0, 0), (1, 1))).astype(np.int8)
+        edges = np.diff(active, axis=1)
+        senders, starts = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        runs = pd.DataFrame(
+            {"sender": senders, "start": starts, "length": ends - starts}
+        )
+        longest = runs.sort_values(
+            ["length", "start"], ascending=[False, True]
+        ).drop_duplicates("sender")
+
+        df = pd.DataFrame(
+            {
+                "Sender": counts.columns[longest["sender"].to_numpy()],
+                "Days": longest["length"].to_numpy(),
+                "Start": counts.index[longest["start"].to_numpy()],
+                "End": counts.index[
+                    (longest["start"] + longest["length"] - 1).to_numpy()
+                ],
+            },
+            index=[str(i + 1) for i in range(len(longest))],
+        )
+
+        return Table("longest_daily_streaks", table=df)
+
+    def _mention_matrix(self) -> pd.DataFrame:
+        """
+        Number of messages by each chatter (rows) that mention each chatter
+        (columns). Every distinct message text is matched only once and
+        weighted by how many times each chatter sent it.
+        """
+        participants = self.context.participants
+        matcher = MentionMatcher(participants, self.nicknames)
+        offsets, mentioned = matcher.match_all(self.state.contents)
+
+        counts = self.context.content_counts
+        lengths, targets = ragged.gather(
+            offsets, mentioned, counts["content"].to_numpy()
+        )
+        senders = np.repeat(counts["sender"].to_numpy(), lengths)
+        weights = np.repeat(counts["count"].to_numpy(), lengths)
+        n = len(participants)
+        flat = np.bincount(senders * n + targets, weights=weights, minlength=n * n)
+        return pd.DataFrame(
+            flat.astype(np.int64).reshape(n, n),
+            index=participants,
+            columns=participants,
+        )
+
+    def _most_mentioned(self, matrix: pd.DataFrame) -> Table:
+        counts = matrix.sum(axis=0)
+        mentions = [(k, int(v)) for k, v in counts.items()]
         mentions.sort(key=lambda x: x[1], reverse=True)
         rows = [{"Mentioned": m[0], "Count": m[1]} for m in mentions]
         row_labels = [str(i + 1) for i in range(len(mentions))]
@@ -73,19 +142,11 @@ class SenderAwards(Metric):
 
         return Table("most_mentioned", table=df)
 
-    def _most_filter_word(self) -> Table:
-        counts = {p: 0 for p in self.get_participants()}
-        for row in self.messages.itertuples():
-            if (
-                isinstance(row.content, str)
-                and self.filter_word.lower() in row.content.lower()
-            ):
-                counts[row.sender] += 1
-
-        mentions = [(k, v) for k, v in counts.items() if v]
+    def _most_filter_word(self, word: str, counts: pd.Series) -> Table:
+        mentions = [(k, int(v)) for k, v in counts.items() if v]
         mentions.sort(key=lambda x: x[1], reverse=True)
         rows = [{"Chatter": m[0], "Times Messaged": m[1]} for m in mentions]
         row_labels = [str(i + 1) for i in range(len(mentions))]
         df = pd.DataFrame(rows, index=row_labels)
 
-        return Table(f"most_times_{self.filter_word}_messaged", table=df)
+        return Table(f"most_times_{word}_messaged", table=df)
@@ -0,0 +1,164 @@
+from functools import cached_property
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ingest.table import MessageTable
+from metrics.state import ChatState, local_times
+from metrics.text.index import TextIndex
+
+
+def bucket_starts(times: pd.DatetimeIndex, bucket: str) -> pd.DatetimeIndex:
+    """
+    Start of the hour, day, week or month each of the local times is in.
+    """
+    if bucket == "hour":
+        return times.floor("h")
+    if bucket == "day":
+        return times.floor("D")
+    if bucket == "week":
+        return times.to_period("W").start_time
+    if bucket == "month":
+        return times.to_period("M").start_time
+    raise Exception(f"Unsupported bucket {bucket}")
+
+
+class ChatContext:
+    """
+    Read only view of a parsed chat shared by every metric. Derived data is
+    computed once on first access and memoized, so metrics never need their
+    own copy of the messages. Everything but datetimes is derived from the
+    chat's aggregate state; the messages themselves are only available when
+    the whole chat was parsed, not when it was updated incrementally. The
+    text index is only there once it has been built for the chat, see
+    metrics.text.index.
+    """
+
+    def __init__(
+        self,
+        state: ChatState,
+        messages: Optional[MessageTable] = None,
+        index: Optional[TextIndex] = None,
+    ):
+        self.state = state
+        self.messages = messages
+        self.index = index
+        self._bucket_counts: Dict[str, pd.DataFrame] = {}
+
+    @classmethod
+    def from_table(
+        cls, messages: MessageTable, index: Optional[TextIndex] = None
+    ) -> "ChatContext":
+        # the state's hours and the messages' datetimes share one conversion
+        times = local_times(messages.timestamp)
+        context = cls(ChatState.from_table(messages, times), messages, index)
+        context.datetimes = times
+        return context
+
+    def __len__(self) -> int:
+        if self.messages is not None:
+            return len(self.messages)
+        return int(self.state.hour_count.sum())
+
+    @cached_property
+    def datetimes(self) -> pd.DatetimeIndex:
+        return local_times(self.messages.timestamp)
+
+    @cached_property
+    def hours(self) -> pd.DatetimeIndex:
+        """
+        Local hour of every row of the state's hourly activity counts.
+        """
+        return pd.DatetimeIndex(self.state.hour.astype("datetime64[ns]"))
+
+    @property
+    def daily_counts(self) -> pd.DataFrame:
+        """
+        Messages sent per active day (rows) by each participant (columns).
+        """
+        return self.bucket_counts("day")
+
+    def bucket_counts(self, bucket: str) -> pd.DataFrame:
+        """
+        Messages sent per active hour, day, week or month (rows, labelled by
+        the bucket start) by each participant (columns).
+        """
+        if bucket not in self._bucket_counts:
+            starts = bucket_starts(self.hours, bucket)
+            self._bucket_counts[bucket] = self._count_by(starts)
+        return self._bucket_counts[bucket]
+
+    def _count_by(self, starts: pd.DatetimeIndex) -> pd.DataFrame:
+        codes, buckets = pd.factorize(starts, sort=True)
+        n_names = len(self.state.names)
+        flat = np.bincount(
+            codes * n_names + self.state.hour_sender,
+            weights=self.state.hour_count,
+            minlength=len(buckets) * n_names,
+        )
+        df = pd.DataFrame(
+            flat.astype(np.int64).reshape(len(buckets), n_names),
+            index=pd.DatetimeIndex(buckets, name="date"),
+            columns=self.state.names,
+        )
+        return df[self.participants]
+
+    @cached_property
+    def calendar_counts(self) -> pd.DataFrame:
+        """
+        daily_counts over every calendar day between the first and last
+        message, with zeros for days nobody messaged.
+        """
+        daily = self.daily_counts
+        if not len(daily):
+            return daily
+        days = pd.date_range(daily.index[0], daily.index[-1], freq="D", name="date")
+        return daily.reindex(days, fill_value=0)
+
+    @cached_property
+    def message_counts(self) -> pd.Series:
+        """
+        Messages sent per participant, most active first.
+        """
+        counts = np.bincount(
+            self.state.hour_sender,
+            weights=self.state.hour_count,
+            minlength=len(self.state.names),
+        )
+        counts = pd.Series(counts.astype(np.int64), index=self.state.names)
+        return counts[counts > 0].sort_values(ascending=False, kind="stable")
+
+    @cached_property
+    def content_counts(self) -> pd.DataFrame:
+        """
+        Number of times each participant (by position) sent each distinct
+        message text (by content code), ordered by content code.
+        """
+        n = len(self.participants)
+        keys, rows = np.unique(
+            self.state.content * n
+            + self.participant_positions[self.state.content_sender],
+            return_inverse=True,
+        )
+        counts = np.bincount(rows, weights=self.state.content_count)
+        return pd.DataFrame(
+            {"content": keys // n, "sender": keys % n, "count": counts.astype(np.int64)}
+        )
+
+    @cached_property
+    def participants(self) -> List[str]:
+        return list(self.message_counts.index)
+
+    @cached_property
+    def participant_positions(self) -> np.ndarray:
+        """
+        Maps a name code to its position in participants, or -1 for names
+        that only ever reacted.
+        """
+        code_of = {n: i for i, n in enumerate(self.state.names)}
+        positions = np.full(len(self.state.names), -1, dtype=np.int64)
+        positions[[code_of[p] for p in self.participants]] = np.arange(
+            len(self.participants)
+        )
+        return positions
@@ -0,0 +1,201 @@
+import time
+from concurrent.futures import Executor, Future, as_completed
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from metrics.figure import Figure
+from metrics.render import Renderer, init_worker
+from profiler import measure
+from status import Status
+
+if TYPE_CHECKING:
+    from metrics.metric import Metric
+    from metrics.results import ResultCache
+
+MODES = ["none", "threads", "processes"]
+POLL_INTERVAL = 0.1
+
+
+def _compute(
+    metric: "Metric", profile_dir: Optional[str] = None
+) -> Tuple[Status, List[Figure]]:
+    return metric.compute(profile_dir)
+
+
+def _result(metric: "Metric", future: Future) -> Tuple[Status, List[Figure]]:
+    try:
+        return future.result()
+    except Exception as e:
+        # the worker itself failed, e.g. the metric could not be pickled
+        return Status(metric=metric.name, success=False, message=str(e)), []
+
+
+def _failed(metric: "Metric", message: str) -> Tuple[Status, List[Figure]]:
+    return Status(metric=metric.name, success=False, message=message), []
+
+
+def _compute_into(metric: "Metric", profile_dir: Optional[str], connection):
+    init_worker()
+    try:
+        connection.send(_compute(metric, profile_dir))
+    except Exception as e:  # the figures could not be pickled
+        connection.send(_failed(metric, str(e)))
+    finally:
+        connection.close()
+
+
+def _compute_killable(
+    metrics: List["Metric"],
+    jobs: int,
+    timeout: float,
+    profile_dir: Optional[str],
+    done: Callable[["Metric", Tuple[Status, List[Figure]]], None],
+):
+    """
+    Computes every metric in a process of its own, at most jobs at once,
+    and passes each result to done as soon as it is in. A metric still
+    running timeout seconds after it started has its process terminated
+    and is reported as failed, so that it doesn't outlive the run.
+    """
+    # started on demand like the pools, which metrics run inline never need
+    import multiprocessing
+    from multiprocessing.connection import wait as ready
+
+    waiting = list(metrics)
+    running: Dict[Any, Tuple["Metric", Any, float]] = {}
+    while waiting or running:
+        while waiting and len(running) < jobs:
+            metric = waiting.pop(0)
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_compute_into, args=(metric, profile_dir, sender), daemon=True
+            )
+            process.start()
+            sender.close()
+            running[receiver] = (metric, process, time.monotonic())
+
+        for receiver in ready(list(running), timeout=POLL_INTERVAL):
+            metric, process, _ = running.pop(receiver)
+            try:
+                result = receiver.recv()
+            except EOFError:  # the worker died before sending anything
+                result = None
+            receiver.close()
+            process.join()
+            if result is None:
+                result = _failed(metric, f"worker exited with code {process.exitcode}")
+            done(metric, result)
+
+        now = time.monotonic()
+        for receiver, (metric, process, started) in list(running.items()):
+            if now - started > timeout:
+                del running[receiver]
+                process.terminate()
+                process.join()
+                receiver.close()
+                done(metric, _failed(metric, f"timed out after {timeout}s"))
+
+
+def _executor(mode: str, jobs: int) -> Executor:
+    # the pools pull in multiprocessing, which metrics run inline never need
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    if mode == "threads":
+        return ThreadPoolExecutor(max_workers=jobs)
+    if mode == "processes":
+        return ProcessPoolExecutor(max_workers=jobs, initializer=init_worker)
+    raise Exception(f"Unsupported parallel mode {mode}")
+
+
+def run_metrics(
+    metrics: List["Metric"],
+    renderer: Optional[Renderer] = None,
+    mode: str = "none",
+    jobs: int = 1,
+    timeout: Optional[float] = None,
+    profile_dir: Optional[str] = None,
+    results: Optional["ResultCache"] = None,
+) -> List[Status]:
+    """
+    Computes every metric and returns their statuses in the given order.
+    With a timeout, whatever the mode, every metric runs in a process of
+    its own since threads can't be interrupted, and a metric still running
+    timeout seconds after it started is terminated and reported as failed.
+    Figures are handed to the renderer as soon as their metric finishes and
+    a metric whose figures fail to render is reported as failed. Render
+    timings are added to the statuses, see Metric.compute for profile_dir.
+    With results, metrics found there are neither computed nor rendered
+    again, and the figures of the others are stored there once written.
+    """
+    renderer = renderer or Renderer()
+    statuses: Dict[str, Status] = {}
+    # figures submitted to the renderer, to store in results once written
+    written: Dict[str, List[Figure]] = {}
+    if results is not None:
+        for m in metrics:
+            _load_cached(m, results, renderer, statuses, written)
+    computing = [m for m in metrics if m.name not in statuses]
+
+    def done(metric: "Metric", result: Tuple[Status, List[Figure]]):
+        statuses[metric.name], figures = result
+        renderer.submit(metric.name, figures)
+        written[metric.name] = figures
+
+    if timeout is not None:
+        jobs = 1 if mode == "none" else max(jobs, 1)
+        _compute_killable(computing, jobs, timeout, profile_dir, done)
+    elif mode == "none":
+        for m in computing:
+            done(m, m.compute(profile_dir))
+    else:
+        executor = _executor(mode, max(jobs, 1))
+        futures = {executor.submit(_compute, m, profile_dir): m for m in computing}
+        for future in as_completed(futures):
+            done(futures[future], _result(futures[future], future))
+        executor.shutdown()
+    return _rendered(metrics, statuses, renderer, results, written)
+
+
+def _load_cached(
+    metric: "Metric",
+    results: "ResultCache",
+    renderer: Renderer,
+    statuses: Dict[str, Status],
+    written: Dict[str, List[Figure]],
+):
+    """
+    Serves the metric from results when it is there: its files are copied
+    when they were written with the renderer's options before, otherwise its
+    figures are handed to the renderer.
+    """
+    with measure(f"load cached {metric.name}") as timing:
+        figures = results.load(metric)
+        restored = figures is not None and results.restore(
+            metric, figures, renderer.options
+        )
+    if figures is None:
+        return
+    print(f"loaded {metric.name} from cache")
+    statuses[metric.name] = Status(metric=metric.name, success=True, timings=[timing])
+    if not restored:
+        renderer.submit(metric.name, figures)
+        written[metric.name] = figures
+
+
+def _rendered(
+    metrics: List["Metric"],
+    statuses: Dict[str, Status],
+    renderer: Renderer,
+    results: Optional["ResultCache"] = None,
+    written: Optional[Dict[str, List[Figure]]] = None,
+) -> List[Status]:
+    errors = renderer.wait()
+    for name, timings in renderer.timings.items():
+        statuses[name].timings += timings
+    for name, message in errors.items():
+        if statuses[name].success:
+            statuses[name] = Status(metric=name, success=False, message=message)
+    if results is not None:
+        for m in metrics:
+            if m.name in (written or {}) and statuses[m.name].success:
+                results.store(m, written[m.name], renderer.options)
+    return [statuses[m.name] for m in metrics]
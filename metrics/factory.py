@@ -1,30 +1,39 @@
-import pandas as pd
+from typing import Dict, List, Optional
 
-from metrics.activity.cumulative import CumulativeActivity
-from metrics.activity.sma import SmaActivity
-from metrics.awards.message import MessageAwards
-from metrics.awards.sender import SenderAwards
+from metrics.context import ChatContext
 from metrics.metric import Metric
-from metrics.reacts.heatmap import ReactHeatmap
+from metrics.options import MetricOptions
+from metrics.registry import load_metric
 
 
 def provide_metric(
     name: str,
-    messages: pd.DataFrame,
+    context: ChatContext,
     filter_top: bool,
     filter_bottom: bool,
-    filter_word: str,
-    window: int,
+    filter_words: List[str],
+    windows: List[int],
+    cumulative_resolution: Optional[str] = None,
+    nicknames: Optional[Dict[str, List[str]]] = None,
+    top_words: int = MetricOptions.top_words,
+    top_common: int = MetricOptions.top_common,
+    top_reacted: int = MetricOptions.top_reacted,
+    activity_buckets: Optional[List[str]] = None,
 ) -> Metric:
-    name = name.lower()
-    if name == CumulativeActivity.name:
-        return CumulativeActivity(messages, filter_top, filter_bottom)
-    if name == SmaActivity.name:
-        return SmaActivity(messages, filter_top, filter_bottom, window)
-    if name == MessageAwards.name:
-        return MessageAwards(messages)
-    if name == SenderAwards.name:
-        return SenderAwards(messages, filter_word)
-    if name == ReactHeatmap.name:
-        return ReactHeatmap(messages)
-    raise Exception(f"Unsupported metric name {name}")
+    """
+    Creates the named metric, importing only its own module. See
+    metrics.registry for the available names.
+    """
+    options = MetricOptions(
+        filter_top=filter_top,
+        filter_bottom=filter_bottom,
+        filter_words=filter_words,
+        windows=windows,
+        cumulative_resolution=cumulative_resolution,
+        nicknames=nicknames,
+        top_words=top_words,
+        top_common=top_common,
+        top_reacted=top_reacted,
+        activity_buckets=activity_buckets,
+    )
+    return load_metric(name).from_options(context, options)
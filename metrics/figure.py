@@ -1,47 +1,173 @@
+import io
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, BinaryIO, List, Optional, Union
 
-import pandas as pd
-from matplotlib import figure
+if TYPE_CHECKING:
+    import pandas as pd
+    from matplotlib.axes import Axes
+
+# whether this process has loaded the plotting libraries and set their style
+_styled = False
+
+
+def use_plot_style():
+    """
+    Loads the plotting libraries and sets the style of every chart. Done
+    once per process when the first chart is drawn, so runs writing only
+    tables never import matplotlib or seaborn.
+    """
+    global _styled
+    if _styled:
+        return
+    import matplotlib
+    import seaborn as sns
+
+    matplotlib.use("Agg")
+    sns.set()
+    _styled = True
+
+
+@dataclass(frozen=True)
+class RenderOptions:
+    FORMATS = ["png", "svg"]
+
+    directory: str = "./figures"
+    format: str = "png"
+    # dots per inch of the written chart, defaults to the figure dpi times zoom
+    dpi: Optional[float] = None
+    zoom: float = 2
 
 
 class Figure(ABC):
-    SAVE_PATH = "./figures/{title}.{ext}"
+    """
+    Output of a metric. Figures only hold the data and parameters needed to
+    produce a file, so they are cheap to create and can be handed to another
+    process to be written.
+    """
+
+    SAVE_PATH = "{directory}/{title}.{ext}"
 
     def __init__(self, title: str):
         self.title = title
-        self.saved = False
+
+    def extension(self, options: RenderOptions) -> str:
+        return options.format
+
+    def path(self, options: RenderOptions = RenderOptions()) -> str:
+        """
+        File the figure is written to.
+        """
+        return self.SAVE_PATH.format(
+            directory=options.directory, title=self.title, ext=self.extension(options)
+        )
 
     @abstractmethod
-    def save(self):
+    def save(self, options: RenderOptions = RenderOptions()):
         pass
 
 
 class Chart(Figure):
-    EXTENSION = "png"
-    ZOOM = 2
+    """
+    Plot drawn onto a standalone matplotlib figure only when it is saved.
+    The figure is created without pyplot so that charts rendered concurrently
+    never share global figure state, and it is closed as soon as it has been
+    written.
+    """
+
+    @abstractmethod
+    def draw(self, ax: "Axes"):
+        pass
 
-    def __init__(self, title: str, figure: figure.Figure):
+    def save(self, options: RenderOptions = RenderOptions()):
+        self._write(self.path(options), options)
+
+    def render(self, options: RenderOptions = RenderOptions()) -> bytes:
+        """
+        The chart's file as bytes, without writing it.
+        """
+        buffer = io.BytesIO()
+        self._write(buffer, options)
+        return buffer.getvalue()
+
+    def _write(self, target: Union[str, BinaryIO], options: RenderOptions):
+        use_plot_style()
+        from matplotlib import figure
+
+        fig = figure.Figure()
+        try:
+            self.draw(fig.subplots())
+            w, h = fig.get_size_inches()
+            fig.set_size_inches(w * options.zoom, h * options.zoom)
+            fig.savefig(
+                target,
+                format=options.format,
+                dpi=options.dpi or fig.get_dpi() * options.zoom,
+            )
+        finally:
+            fig.clf()
+
+
+class LineChart(Chart):
+    def __init__(
+        self,
+        title: str,
+        data: "pd.DataFrame",
+        plot_title: str,
+        x: Optional[str] = None,
+        y: Optional[List[str]] = None,
+        log: bool = False,
+    ):
         super().__init__(title)
-        self.figure = figure
-
-    def save(self):
-        w, h = self.figure.get_size_inches()
-        self.figure.set_size_inches(w * self.ZOOM, h * self.ZOOM)
-        self.figure.savefig(
-            self.SAVE_PATH.format(title=self.title, ext=self.EXTENSION),
-            dpi=self.figure.get_dpi() * self.ZOOM,
+        self.data = data
+        self.plot_title = plot_title
+        self.x = x
+        self.y = y
+        self.log = log
+
+    def draw(self, ax: "Axes"):
+        self.data.plot(
+            ax=ax, x=self.x, y=self.y, title=self.plot_title, loglog=self.log
         )
-        self.figure.clf()
-        self.saved = True
+
+
+class HeatmapChart(Chart):
+    def __init__(
+        self,
+        title: str,
+        data: "pd.DataFrame",
+        plot_title: str,
+        xlabel: str,
+        ylabel: str,
+        label_size: Optional[str] = None,
+    ):
+        super().__init__(title)
+        self.data = data
+        self.plot_title = plot_title
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+        self.label_size = label_size
+
+    def draw(self, ax: "Axes"):
+        import seaborn as sns
+
+        sns.heatmap(self.data, annot=True, fmt="g", annot_kws={"size": 18}, ax=ax)
+        ax.set(title=self.plot_title, xlabel=self.xlabel, ylabel=self.ylabel)
+        ax.set_xticklabels(
+            labels=ax.get_xticklabels(), rotation=60, ha="right", size=self.label_size
+        )
+        ax.figure.tight_layout()
 
 
 class Table(Figure):
     EXTENSION = "csv"
 
-    def __init__(self, title: str, table: pd.DataFrame):
+    def __init__(self, title: str, table: "pd.DataFrame"):
         super().__init__(title)
         self.table = table
 
-    def save(self):
-        self.table.to_csv(self.SAVE_PATH.format(title=self.title, ext=self.EXTENSION))
-        self.saved = True
+    def extension(self, options: RenderOptions) -> str:
+        return self.EXTENSION
+
+    def save(self, options: RenderOptions = RenderOptions()):
+        self.table.to_csv(self.path(options))
@@ -0,0 +1,71 @@
+from typing import Dict, List
+
+import pandas as pd
+
+from metrics.figure import Figure, LineChart, Table
+
+
+class InboxSummary:
+    """
+    Rollups across every chat of a batch run, built from each chat's
+    messages sent per participant and per month.
+    """
+
+    # chats plotted, and chats ranked within each month
+    TOP_CHATS = 10
+    TOP_PER_MONTH = 3
+
+    def __init__(self):
+        self._senders: Dict[str, pd.Series] = {}
+        self._months: Dict[str, pd.Series] = {}
+
+    def add(self, chat: str, message_counts: pd.Series, monthly_counts: pd.Series):
+        self._senders[chat] = message_counts
+        self._months[chat] = monthly_counts
+
+    def figures(self) -> List[Figure]:
+        if not self._senders:
+            return []
+        return [
+            self._activity_by_person(),
+            self._busiest_chats_by_month(),
+            self._plot_busiest_chats(),
+        ]
+
+    def _activity_by_person(self) -> Table:
+        counts = pd.DataFrame(self._senders).fillna(0).astype(int)
+        totals = counts.sum(axis=1).sort_values(ascending=False, kind="stable")
+        counts = counts.loc[totals.index]
+        df = pd.DataFrame(
+            {
+                "Person": totals.index,
+                "Messages": totals.to_numpy(),
+                "Chats": (counts > 0).sum(axis=1).to_numpy(),
+                "Busiest Chat": counts.idxmax(axis=1).to_numpy(),
+            },
+            index=[str(i + 1) for i in range(len(totals))],
+        )
+        return Table("inbox_activity_by_person", table=df)
+
+    def _monthly(self) -> pd.DataFrame:
+        return pd.DataFrame(self._months).fillna(0).astype(int).sort_index()
+
+    def _busiest_chats_by_month(self) -> Table:
+        long = self._monthly().stack().rename("Messages").reset_index()
+        long.columns = ["Month", "Chat", "Messages"]
+        long = long[long["Messages"] > 0].sort_values(
+            ["Month", "Messages"], ascending=[True, False], kind="stable"
+        )
+        long = long.groupby("Month").head(self.TOP_PER_MONTH)
+        long.insert(1, "Rank", long.groupby("Month").cumcount() + 1)
+        long.index = [str(i + 1) for i in range(len(long))]
+        return Table("inbox_busiest_chats_by_month", table=long)
+
+    def _plot_busiest_chats(self) -> LineChart:
+        monthly = self._monthly()
+        top = monthly.sum(axis=0).nlargest(self.TOP_CHATS, keep="first").index
+        return LineChart(
+            title="inbox_busiest_chats",
+            data=monthly[top],
+            plot_title=f"Messages sent per month in the {len(top)} busiest chats",
+        )
@@ -1,17 +1,43 @@
+import cProfile
+import os
 import traceback
 from abc import ABC, abstractmethod, abstractproperty
-from typing import List, Set
-
-import pandas as pd
-from datetime import datetime
+from dataclasses import fields
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+from metrics.context import ChatContext
 from metrics.figure import Figure
+from metrics.options import MetricOptions
+from profiler import measure
 from status import Status
 
 
 class Metric(ABC):
-    def __init__(self, messages: pd.DataFrame):
-        self.messages = messages
+    # names of the MetricOptions fields the metric's figures depend on, which
+    # key its cached results, see metrics.results. None keys them on every
+    # option, so that a metric that doesn't declare its own is never served
+    # stale results
+    OPTIONS: Optional[Tuple[str, ...]] = None
+
+    def __init__(self, context: ChatContext):
+        self.context = context
+        self.state = context.state
+        self.messages = context.messages
+
+    @classmethod
+    def from_options(cls, context: ChatContext, options: MetricOptions) -> "Metric":
+        """
+        Creates the metric from the command line settings. Metrics taking
+        settings beyond the context override this to pick theirs.
+        """
+        return cls(context)
+
+    @classmethod
+    def parameters(cls, options: MetricOptions) -> Dict[str, Any]:
+        names = cls.OPTIONS
+        if names is None:
+            names = tuple(f.name for f in fields(options))
+        return {n: getattr(options, n) for n in names}
 
     @abstractproperty
     def name(self):
@@ -21,22 +47,33 @@ class Metric(ABC):
     def compute_metric(self) -> List[Figure]:
         pass
 
-    def compute(self) -> Status:
+    def compute(self, profile_dir: Optional[str] = None) -> Tuple[Status, List[Figure]]:
+        """
+        Computes the metric and returns its status, which carries the time
+        taken, along with the figures to write. Figures are written
+        separately, see metrics.render. With a profile_dir the computation
+        runs under cProfile and the stats are dumped to <name>.prof there.
+        """
+        status = Status(metric=self.name, success=True)
         try:
             print(f"computing {self.name}")
-            for figure in self.compute_metric():
-                if not figure.saved:
-                    figure.save()
-            return Status(metric=self.name, success=True)
+            with measure(f"compute {self.name}", rows=len(self.context)) as timing:
+                status.timings.append(timing)
+                figures = self._compute_metric(profile_dir)
+            return status, figures
         except Exception as e:
-            return Status(
-                metric=self.name,
-                success=False,
-                message=f"{traceback.format_exc()}\n{str(e)}",
-            )
+            status.success = False
+            status.message = f"{traceback.format_exc()}\n{str(e)}"
+            return status, []
 
-    def get_participants(self) -> Set[str]:
-        return set(self.messages["sender"].unique())
+    def _compute_metric(self, profile_dir: Optional[str]) -> List[Figure]:
+        if profile_dir is None:
+            return self.compute_metric()
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(self.compute_metric)
+        finally:
+            profile.dump_stats(os.path.join(profile_dir, f"{self.name}.prof"))
 
-    def timestamp_to_date(self, ts: int) -> int:
-        return datetime.fromtimestamp(ts / 1000)
+    def get_participants(self) -> Set[str]:
+        return set(self.context.participants)
@@ -0,0 +1,27 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+BUCKETS = ["hour", "day", "week", "month"]
+# most reacted messages a run can ask for. The chat state keeps twice as many,
+# so that enough are left once message_awards drops its blacklisted ones
+MAX_TOP_REACTED = 1000
+
+
+@dataclass(frozen=True)
+class MetricOptions:
+    """
+    Every setting metrics can be configured with from the command line. A
+    metric picks the ones it uses in Metric.from_options. This module only
+    holds plain values, so it can be imported without loading any metric.
+    """
+
+    filter_top: bool = False
+    filter_bottom: bool = False
+    filter_words: List[str] = field(default_factory=list)
+    windows: List[int] = field(default_factory=lambda: [40])
+    cumulative_resolution: Optional[str] = None
+    nicknames: Optional[Dict[str, List[str]]] = None
+    top_words: int = 20
+    top_common: int = 100
+    top_reacted: int = 50
+    activity_buckets: Optional[List[str]] = None
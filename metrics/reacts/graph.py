@@ -0,0 +1,83 @@
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from metrics.state import ChatState
+from metrics.text.encoding import fix_encoding
+
+
+class ReactionGraph:
+    """
+    Who reacted to whose messages and with which reaction, built from the
+    state's sparse reaction counts with weighted bincounts over combined
+    codes. The dense matrix is only materialized on request, edges() gives
+    the sparse (coordinate) form for chats with many participants.
+    """
+
+    def __init__(self, state: ChatState):
+        self.names = state.names
+        self.kinds = state.kinds
+        self.reactors = state.react_reactor
+        self.senders = state.react_sender
+        self.reaction = state.react_kind
+        self.counts = state.react_count
+
+    @cached_property
+    def sent(self) -> np.ndarray:
+        return self._count(self.reactors, len(self.names))
+
+    @cached_property
+    def received(self) -> np.ndarray:
+        return self._count(self.senders, len(self.names))
+
+    def _count(self, keys: np.ndarray, n: int) -> np.ndarray:
+        return np.bincount(keys, weights=self.counts, minlength=n).astype(np.int64)
+
+    def dense(self, codes: np.ndarray) -> pd.DataFrame:
+        """
+        Reactions by each of the given names (rows) to messages by each of
+        them (columns).
+        """
+        n = len(self.names)
+        flat = self._count(self.reactors * n + self.senders, n * n)
+        matrix = flat.reshape(n, n)[np.ix_(codes, codes)]
+        labels = self.names[codes]
+        return pd.DataFrame(matrix, index=labels, columns=labels)
+
+    def edges(self) -> pd.DataFrame:
+        n = len(self.names)
+        keys, rows = np.unique(self.reactors * n + self.senders, return_inverse=True)
+        counts = self._count(rows, len(keys))
+        df = pd.DataFrame(
+            {
+                "Reactor": self.names[keys // n],
+                "Sender": self.names[keys % n],
+                "Reacts": counts,
+            }
+        )
+        return df.sort_values("Reacts", ascending=False, kind="stable")
+
+    def sent_kinds(self) -> pd.DataFrame:
+        return self._kinds_by(self.reactors)
+
+    def received_kinds(self) -> pd.DataFrame:
+        return self._kinds_by(self.senders)
+
+    def _kinds_by(self, codes: np.ndarray) -> pd.DataFrame:
+        """
+        Reactions of each type for every name with any, where codes holds the
+        name code (reactor or sender) of each reaction.
+        """
+        k = len(self.kinds)
+        flat = self._count(codes * k + self.reaction, len(self.names) * k)
+        df = pd.DataFrame(
+            flat.reshape(len(self.names), k),
+            index=self.names,
+            columns=[fix_encoding(kind) for kind in self.kinds],
+        )
+        totals = df.sum(axis=1)
+        df = df.loc[
+            totals[totals > 0].sort_values(ascending=False, kind="stable").index
+        ]
+        return df[df.columns[np.argsort(-df.sum(axis=0).to_numpy(), kind="stable")]]
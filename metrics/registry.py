@@ -0,0 +1,56 @@
+from functools import lru_cache
+from importlib import import_module
+from importlib.metadata import EntryPoint, entry_points
+from typing import TYPE_CHECKING, Dict, List, Type
+
+if TYPE_CHECKING:
+    from metrics.metric import Metric
+
+# installed packages add metrics by declaring entry points in this group,
+# named after the metric and pointing at its class, e.g. in pyproject.toml:
+# [project.entry-points.messenger_metrics]
+# my_metric = "my_package.metrics:MyMetric"
+ENTRY_POINT_GROUP = "messenger_metrics"
+
+BUILTIN_METRICS = {
+    "cumulative_activity": "metrics.activity.cumulative:CumulativeActivity",
+    "sma_activity": "metrics.activity.sma:SmaActivity",
+    "message_awards": "metrics.awards.message:MessageAwards",
+    "sender_awards": "metrics.awards.sender:SenderAwards",
+    "reacts": "metrics.reacts.heatmap:ReactHeatmap",
+    "word_frequency": "metrics.words.frequency:WordFrequency",
+}
+
+
+def _entry_points() -> List[EntryPoint]:
+    try:
+        return list(entry_points(group=ENTRY_POINT_GROUP))
+    except TypeError:  # Python 3.9 returns the entry points of every group
+        return list(entry_points().get(ENTRY_POINT_GROUP, []))
+
+
+@lru_cache(maxsize=None)
+def _plugins() -> Dict[str, EntryPoint]:
+    return {e.name: e for e in _entry_points() if e.name not in BUILTIN_METRICS}
+
+
+def metric_names() -> List[str]:
+    """
+    Names of every available metric, built in ones first. Listing them
+    imports no metric.
+    """
+    return list(BUILTIN_METRICS) + sorted(_plugins())
+
+
+def load_metric(name: str) -> Type["Metric"]:
+    """
+    Imports the module of the named metric and returns its class.
+    """
+    name = name.lower()
+    if name in BUILTIN_METRICS:
+        module, _, attribute = BUILTIN_METRICS[name].partition(":")
+        return getattr(import_module(module), attribute)
+    plugin = _plugins().get(name)
+    if plugin is None:
+        raise Exception(f"Unsupported metric name {name}")
+    return plugin.load()
@@ -0,0 +1,80 @@
+import traceback
+from collections import defaultdict
+from concurrent.futures import Executor, Future
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from metrics.figure import Figure, RenderOptions
+from profiler import measure
+from status import Timing
+
+
+def init_worker():
+    """
+    Setup for a process worker, with the same pandas options the main
+    process uses. Plotting is set up by the first chart drawn, see
+    metrics.figure.use_plot_style.
+    """
+    import pandas as pd
+
+    pd.options.mode.chained_assignment = None
+
+
+def _save(figure: Figure, options: RenderOptions) -> Timing:
+    with measure(f"render {figure.title}") as timing:
+        figure.save(options)
+    return timing
+
+
+class Renderer:
+    """
+    Writes the figures metrics return. With jobs > 0 figures are rendered on
+    a pool of processes, so metrics keep computing while earlier charts are
+    rasterized; with jobs == 0 every figure is written as it is submitted.
+    The time taken to write each figure is kept in timings, by metric, once
+    wait has returned.
+    """
+
+    def __init__(self, options: RenderOptions = RenderOptions(), jobs: int = 0):
+        self.options = options
+        self._pool: Optional[Executor] = None
+        if jobs > 0:
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._pool = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker)
+        self._pending: List[Tuple[str, Future]] = []
+        self._errors: Dict[str, str] = {}
+        self._lock = Lock()
+        self.timings: Dict[str, List[Timing]] = defaultdict(list)
+
+    def submit(self, metric: str, figures: List[Figure]):
+        for figure in figures:
+            if self._pool is None:
+                try:
+                    self.timings[metric].append(_save(figure, self.options))
+                except Exception as e:
+                    self._fail(metric, f"{traceback.format_exc()}\n{str(e)}")
+                continue
+            future = self._pool.submit(_save, figure, self.options)
+            with self._lock:
+                self._pending.append((metric, future))
+
+    def wait(self) -> Dict[str, str]:
+        """
+        Blocks until every submitted figure is written and returns an error
+        message for each metric that had a figure fail to render.
+        """
+        for metric, future in self._pending:
+            try:
+                self.timings[metric].append(future.result())
+            except Exception as e:
+                self._fail(metric, str(e))
+        self._pending = []
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        return self._errors
+
+    def _fail(self, metric: str, message: str):
+        with self._lock:
+            self._errors.setdefault(metric, message)
@@ -0,0 +1,168 @@
+import glob
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple, Type
+
+from ingest.cache import FORMAT_VERSION
+from metrics.figure import Figure, RenderOptions
+from metrics.metric import Metric
+from metrics.options import MetricOptions
+
+RESULTS_DIR = "results"
+MAX_BYTES = 256 * 1024 * 1024
+FIGURES_FILE = "figures.pickle"
+# packages whose code results depend on
+PACKAGES = ("ingest", "metrics")
+
+
+@lru_cache(maxsize=None)
+def _digest_files(paths: Tuple[str, ...]) -> str:
+    h = hashlib.sha1(f"v{FORMAT_VERSION}".encode())
+    for path in paths:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def code_version(metric: Type[Metric]) -> str:
+    """
+    Digest of the source of the metrics and ingest packages along with the
+    module defining the metric, which is outside of them for metrics of
+    other packages, and of the parse cache's format version, so that results
+    are computed again whenever the code reading or computing them changes.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    paths = {
+        path
+        for package in PACKAGES
+        for path in glob.glob(os.path.join(root, package, "**", "*.py"), recursive=True)
+    }
+    source = inspect.getsourcefile(metric)
+    if source is not None:
+        paths.add(os.path.abspath(source))
+    return _digest_files(tuple(sorted(paths)))
+
+
+def _size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, f))
+        for directory, _, files in os.walk(path)
+        for f in files
+    )
+
+
+def _used(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:  # evicted by a concurrent run
+        return 0.0
+
+
+class ResultCache:
+    """
+    Figures of computed metrics, kept on disk so that a metric whose inputs
+    haven't changed is neither computed nor rendered again. An entry is keyed
+    by the data the metrics were computed from, the metric's name, the
+    options it declares in Metric.OPTIONS and the version of its code. It
+    holds the pickled figures, plus the files they were written to for every
+    set of render options they were written with. Entries are evicted least
+    recently used first once they take up more than max_bytes.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        data: Any,
+        options: MetricOptions,
+        max_bytes: int = MAX_BYTES,
+        rebuild: bool = False,
+    ):
+        self.directory = directory
+        self.data = data
+        self.options = options
+        self.max_bytes = max_bytes
+        self.rebuild = rebuild
+
+    def key(self, metric: Metric) -> str:
+        key = {
+            "data": self.data,
+            "metric": metric.name,
+            "parameters": metric.parameters(self.options),
+            "code": code_version(type(metric)),
+        }
+        return hashlib.sha1(
+            json.dumps(key, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def _entry(self, metric: Metric) -> str:
+        return os.path.join(self.directory, self.key(metric))
+
+    @staticmethod
+    def _rendered(entry: str, options: RenderOptions) -> str:
+        render = json.dumps([options.format, options.dpi, options.zoom])
+        return os.path.join(entry, hashlib.sha1(render.encode()).hexdigest())
+
+    def load(self, metric: Metric) -> Optional[List[Figure]]:
+        entry = self._entry(metric)
+        path = os.path.join(entry, FIGURES_FILE)
+        if self.rebuild or not os.path.isfile(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                figures = pickle.load(f)
+        except Exception:
+            # written by an incompatible version of a dependency
+            return None
+        os.utime(entry)
+        return figures
+
+    def restore(
+        self, metric: Metric, figures: List[Figure], options: RenderOptions
+    ) -> bool:
+        """
+        Copies the files the figures were written to with the same render
+        options into options.directory. Returns False when they never were.
+        """
+        rendered = self._rendered(self._entry(metric), options)
+        files = [os.path.basename(f.path(options)) for f in figures]
+        if not all(os.path.isfile(os.path.join(rendered, f)) for f in files):
+            return False
+        for f in files:
+            shutil.copyfile(
+                os.path.join(rendered, f), os.path.join(options.directory, f)
+            )
+        return True
+
+    def store(self, metric: Metric, figures: List[Figure], options: RenderOptions):
+        """
+        Saves the figures and the files they were written to with options,
+        then evicts the least recently used entries over the size limit.
+        """
+        entry = self._entry(metric)
+        os.makedirs(entry, exist_ok=True)
+        path = os.path.join(entry, FIGURES_FILE)
+        if not os.path.isfile(path) or self.rebuild:
+            with open(f"{path}.tmp", "wb") as f:
+                pickle.dump(figures, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{path}.tmp", path)
+        rendered = self._rendered(entry, options)
+        os.makedirs(rendered, exist_ok=True)
+        for figure in figures:
+            source = figure.path(options)
+            shutil.copyfile(source, os.path.join(rendered, os.path.basename(source)))
+        os.utime(entry)
+        self.evict()
+
+    def evict(self):
+        entries = [os.path.join(self.directory, e) for e in os.listdir(self.directory)]
+        entries.sort(key=_used, reverse=True)
+        total = 0
+        for entry in entries:
+            total += _size(entry)
+            if total > self.max_bytes:
+                shutil.rmtree(entry, ignore_errors=True)
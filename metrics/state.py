@@ -0,0 +1,300 @@
+import json
+import os
+import shutil
+import time
+from dataclasses import dataclass, fields, replace
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ingest.table import MessageTable
+from metrics.options import MAX_TOP_REACTED
+
+DAY = 24 * 60 * 60
+# every zone changes its UTC offset on a quarter hour
+QUARTER_HOUR = 15 * 60
+
+
+def _utc_offsets(starts: np.ndarray) -> np.ndarray:
+    return np.array(
+        [time.localtime(t).tm_gmtoff for t in starts.tolist()], dtype=np.int64
+    )
+
+
+def local_times(timestamp: np.ndarray) -> pd.DatetimeIndex:
+    """
+    Local wall clock time of millisecond timestamps, same as
+    datetime.fromtimestamp. The UTC offset is looked up at the start and
+    end of every distinct day rather than for every timestamp, and by the
+    quarter hour on the days it changes.
+    """
+    seconds = np.asarray(timestamp, dtype=np.int64) // 1000
+    days, day_of = np.unique(seconds // DAY, return_inverse=True)
+    first = _utc_offsets(days * DAY)
+    last = _utc_offsets(days * DAY + DAY - 1)
+    offsets = first[day_of]
+    changed = (first != last)[day_of]
+    if changed.any():
+        quarters, quarter_of = np.unique(
+            seconds[changed] // QUARTER_HOUR, return_inverse=True
+        )
+        offsets[changed] = _utc_offsets(quarters * QUARTER_HOUR)[quarter_of]
+    local = (np.asarray(timestamp, dtype=np.int64) + offsets * 1000) * 1_000_000
+    return pd.DatetimeIndex(local.view("datetime64[ns]"))
+
+
+def _reduce(
+    keys: List[np.ndarray], counts: np.ndarray
+) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    Sums counts over rows with equal keys. Returns the distinct keys in
+    lexicographic order with their totals.
+    """
+    keys = [np.asarray(k, dtype=np.int64) for k in keys]
+    counts = np.asarray(counts, dtype=np.int64)
+    if not len(counts):
+        return keys, counts
+    order = np.lexsort(keys[::-1])
+    keys = [k[order] for k in keys]
+    new = np.ones(len(order), dtype=bool)
+    for k in keys:
+        new[1:] |= k[1:] != k[:-1]
+    starts = np.flatnonzero(new)
+    return [k[starts] for k in keys], np.add.reduceat(counts[order], starts)
+
+
+def _union(values: np.ndarray, others: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Appends the values of others missing from values. Returns the combined
+    dictionary and the code of each of others in it.
+    """
+    code_of = {v: i for i, v in enumerate(values)}
+    extra = []
+    mapping = np.empty(len(others), dtype=np.int64)
+    for i, v in enumerate(others):
+        if v not in code_of:
+            code_of[v] = len(values) + len(extra)
+            extra.append(v)
+        mapping[i] = code_of[v]
+    combined = np.concatenate([values, np.array(extra, dtype=object)])
+    return combined.astype(object), mapping
+
+
+@dataclass(frozen=True)
+class ChatState:
+    """
+    Aggregates of a chat that every metric is computed from, small enough to
+    persist between runs and mergeable, so a chat can be brought up to date
+    by folding in the state of only its new messages.
+
+    All counts are sparse: hour_* holds the messages each name sent in each
+    local hour (as nanoseconds), content_* how many times each name sent each
+    text, react_* the reactions of each kind by each reactor to each sender.
+    content_last is the latest timestamp each text was sent at. reacted_*
+    keeps the REACTED_CAPACITY messages with the most reacts, in order.
+    Names, contents and kinds are the dictionaries the codes index into.
+    """
+
+    DICTIONARIES = ("names", "contents", "kinds")
+    REACTED_CAPACITY = 2 * MAX_TOP_REACTED
+
+    names: np.ndarray
+    contents: np.ndarray
+    kinds: np.ndarray
+    hour: np.ndarray
+    hour_sender: np.ndarray
+    hour_count: np.ndarray
+    content: np.ndarray
+    content_sender: np.ndarray
+    content_count: np.ndarray
+    content_last: np.ndarray
+    react_reactor: np.ndarray
+    react_sender: np.ndarray
+    react_kind: np.ndarray
+    react_count: np.ndarray
+    reacted_timestamp: np.ndarray
+    reacted_sender: np.ndarray
+    reacted_content: np.ndarray
+    reacted_count: np.ndarray
+    # timestamp of the newest message folded in, None when there are none
+    watermark: Optional[int] = None
+
+    @classmethod
+    def arrays(cls) -> List[str]:
+        return [
+            f.name
+            for f in fields(cls)
+            if f.name not in cls.DICTIONARIES and f.name != "watermark"
+        ]
+
+    @classmethod
+    def from_table(
+        cls, table: MessageTable, times: Optional[pd.DatetimeIndex] = None
+    ) -> "ChatState":
+        """
+        State of the table's messages. times are their local_times, when
+        the caller has already converted them.
+        """
+        ones = np.ones(len(table), dtype=np.int64)
+        if times is None:
+            times = local_times(table.timestamp)
+        hours = times.floor("h")
+        hours = hours.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        (hour, hour_sender), hour_count = _reduce([hours, table.sender], ones)
+
+        has_content = table.content >= 0
+        (content, content_sender), content_count = _reduce(
+            [table.content[has_content], table.sender[has_content]],
+            ones[has_content],
+        )
+        # rows are chronological, so the first of each code read backwards is
+        # the last time it was sent
+        codes = table.content[has_content][::-1]
+        _, first = np.unique(codes, return_index=True)
+        content_last = table.timestamp[has_content][::-1][first]
+
+        reactors, senders = table.reactions()
+        (react_reactor, react_sender, react_kind), react_count = _reduce(
+            [reactors, senders, table.reaction], np.ones(len(reactors), dtype=np.int64)
+        )
+
+        reacts = table.react_counts
+        rows = np.flatnonzero(has_content & (reacts > 0))
+        top = cls._top_reacted(reacts[rows])
+
+        return cls(
+            names=table.names,
+            contents=table.contents,
+            kinds=table.kinds,
+            hour=hour,
+            hour_sender=hour_sender,
+            hour_count=hour_count,
+            content=content,
+            content_sender=content_sender,
+            content_count=content_count,
+            content_last=np.asarray(content_last, dtype=np.int64),
+            react_reactor=react_reactor,
+            react_sender=react_sender,
+            react_kind=react_kind,
+            react_count=react_count,
+            reacted_timestamp=np.asarray(table.timestamp[rows[top]], dtype=np.int64),
+            reacted_sender=np.asarray(table.sender[rows[top]], dtype=np.int64),
+            reacted_content=np.asarray(table.content[rows[top]], dtype=np.int64),
+            reacted_count=np.asarray(reacts[rows[top]], dtype=np.int64),
+            watermark=int(table.timestamp[-1]) if len(table) else None,
+        )
+
+    @classmethod
+    def _top_reacted(cls, counts: np.ndarray) -> np.ndarray:
+        """
+        Positions of the messages with the most reacts, earliest first among
+        ties, returned in their original order.
+        """
+        order = np.lexsort((np.arange(len(counts)), -counts))
+        return np.sort(order[: cls.REACTED_CAPACITY])
+
+    def merge(self, newer: "ChatState") -> "ChatState":
+        """
+        State of this chat's messages together with those of newer, which
+        must all have been sent after this state's watermark.
+        """
+        names, name_of = _union(self.names, newer.names)
+        contents, content_of = _union(self.contents, newer.contents)
+        kinds, kind_of = _union(self.kinds, newer.kinds)
+
+        (hour, hour_sender), hour_count = _reduce(
+            [
+                np.concatenate([self.hour, newer.hour]),
+                np.concatenate([self.hour_sender, name_of[newer.hour_sender]]),
+            ],
+            np.concatenate([self.hour_count, newer.hour_count]),
+        )
+        (content, content_sender), content_count = _reduce(
+            [
+                np.concatenate([self.content, content_of[newer.content]]),
+                np.concatenate([self.content_sender, name_of[newer.content_sender]]),
+            ],
+            np.concatenate([self.content_count, newer.content_count]),
+        )
+        content_last = np.zeros(len(contents), dtype=np.int64)
+        content_last[: len(self.content_last)] = self.content_last
+        content_last[content_of] = np.maximum(
+            content_last[content_of], newer.content_last
+        )
+        (react_reactor, react_sender, react_kind), react_count = _reduce(
+            [
+                np.concatenate([self.react_reactor, name_of[newer.react_reactor]]),
+                np.concatenate([self.react_sender, name_of[newer.react_sender]]),
+                np.concatenate([self.react_kind, kind_of[newer.react_kind]]),
+            ],
+            np.concatenate([self.react_count, newer.react_count]),
+        )
+
+        reacted_timestamp = np.concatenate(
+            [self.reacted_timestamp, newer.reacted_timestamp]
+        )
+        reacted_count = np.concatenate([self.reacted_count, newer.reacted_count])
+        top = self._top_reacted(reacted_count)
+
+        watermarks = [w for w in (self.watermark, newer.watermark) if w is not None]
+        return replace(
+            self,
+            names=names,
+            contents=contents,
+            kinds=kinds,
+            hour=hour,
+            hour_sender=hour_sender,
+            hour_count=hour_count,
+            content=content,
+            content_sender=content_sender,
+            content_count=content_count,
+            content_last=content_last,
+            react_reactor=react_reactor,
+            react_sender=react_sender,
+            react_kind=react_kind,
+            react_count=react_count,
+            reacted_timestamp=reacted_timestamp[top],
+            reacted_sender=np.concatenate(
+                [self.reacted_sender, name_of[newer.reacted_sender]]
+            )[top],
+            reacted_content=np.concatenate(
+                [self.reacted_content, content_of[newer.reacted_content]]
+            )[top],
+            reacted_count=reacted_count[top],
+            watermark=max(watermarks) if watermarks else None,
+        )
+
+    def save(self, directory: str):
+        tmp = f"{directory.rstrip(os.sep)}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in self.arrays():
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        dictionaries: Dict[str, object] = {
+            name: list(getattr(self, name)) for name in self.DICTIONARIES
+        }
+        dictionaries["watermark"] = self.watermark
+        with open(os.path.join(tmp, "dictionaries.json"), "w", encoding="utf-8") as f:
+            json.dump(dictionaries, f)
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(tmp, directory)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["ChatState"]:
+        if not os.path.isdir(directory):
+            return None
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"))
+            for name in cls.arrays()
+        }
+        with open(os.path.join(directory, "dictionaries.json"), encoding="utf-8") as f:
+            dictionaries = json.load(f)
+        return cls(
+            names=np.array(dictionaries["names"], dtype=object),
+            contents=np.array(dictionaries["contents"], dtype=object),
+            kinds=np.array(dictionaries["kinds"], dtype=object),
+            watermark=dictionaries["watermark"],
+            **arrays,
+        )
@@ -0,0 +1,9 @@
+def fix_encoding(text: str) -> str:
+    """
+    Facebook exports write utf-8 bytes as latin-1 escapes, so emoji come out
+    as mojibake such as 'â\x9d¤'. Returns the intended text when it decodes.
+    """
+    try:
+        return text.encode("latin-1").decode("utf-8")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return text
@@ -0,0 +1,183 @@
+import json
+import os
+import shutil
+from dataclasses import dataclass, fields
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ingest import ragged
+from ingest.columns import MessageFilter
+from ingest.table import MessageTable
+from metrics.text.tokens import message_tokens, tokenize
+
+
+@dataclass(frozen=True)
+class TextIndex:
+    """
+    Inverted index of a chat's message texts. tokens is the sorted
+    vocabulary and the postings of tokens[i] are offsets[i] to
+    offsets[i + 1]: one per occurrence, ordered by row then position, with
+    the row of the message in the indexed table, the position of the token
+    within the message and the message's sender code (into names) and
+    timestamp. Texts are tokenized with message_tokens, so phrases match
+    the way they do in scan_words. key identifies the indexed message files
+    and indexes of an older VERSION are not loaded.
+    """
+
+    DICTIONARIES = ("names", "tokens")
+    # bumped whenever texts are tokenized differently
+    VERSION = 2
+
+    names: np.ndarray
+    tokens: np.ndarray
+    offsets: np.ndarray
+    row: np.ndarray
+    position: np.ndarray
+    sender: np.ndarray
+    timestamp: np.ndarray
+    key: Optional[str] = None
+
+    @classmethod
+    def arrays(cls) -> List[str]:
+        return [
+            f.name
+            for f in fields(cls)
+            if f.name not in cls.DICTIONARIES and f.name != "key"
+        ]
+
+    @classmethod
+    def from_table(cls, table: MessageTable, key: Optional[str] = None) -> "TextIndex":
+        # every distinct text is tokenized once, then spread over its rows
+        tokenized = [message_tokens(c) for c in table.contents]
+        lengths = np.array([len(t) for t in tokenized], dtype=np.int64)
+        codes, tokens = pd.factorize(
+            pd.Series([t for ts in tokenized for t in ts], dtype=object), sort=True
+        )
+        content_offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+        rows = np.flatnonzero(table.content >= 0)
+        lengths, token = ragged.gather(
+            content_offsets, codes.astype(np.int64), table.content[rows]
+        )
+        rows = np.repeat(rows, lengths)
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        position = np.arange(len(token), dtype=np.int64) - starts
+
+        order = np.argsort(token, kind="stable")
+        counts = np.bincount(token, minlength=len(tokens))
+        return cls(
+            names=table.names,
+            tokens=np.asarray(tokens, dtype=object),
+            offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            row=rows[order].astype(np.int32),
+            position=position[order].astype(np.int32),
+            sender=table.sender[rows[order]],
+            timestamp=table.timestamp[rows[order]],
+            key=key,
+        )
+
+    def _postings(self, token: str) -> Optional[slice]:
+        i = int(np.searchsorted(self.tokens, token))
+        if i == len(self.tokens) or self.tokens[i] != token:
+            return None
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def find(self, phrase: str) -> np.ndarray:
+        """
+        Postings of the phrase's first token, one for every message that
+        contains the whole phrase.
+        """
+        postings = [self._postings(t) for t in tokenize(phrase)]
+        if not postings or any(p is None for p in postings):
+            return np.array([], dtype=np.int64)
+
+        def keys(p: slice) -> np.ndarray:
+            return (self.row[p].astype(np.int64) << 32) | self.position[p]
+
+        first = keys(postings[0])
+        match = np.ones(len(first), dtype=bool)
+        for i, p in enumerate(postings[1:], start=1):
+            # the i-th token of the phrase must be i positions further along
+            following = keys(p)
+            if not len(following):  # no occurrence left after select
+                return np.array([], dtype=np.int64)
+            found = np.minimum(
+                np.searchsorted(following, first + i), len(following) - 1
+            )
+            match &= following[found] == first + i
+        hits = np.flatnonzero(match) + postings[0].start
+        _, first_hit = np.unique(self.row[hits], return_index=True)
+        return hits[first_hit]
+
+    def hits(self, phrase: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sender codes and timestamps of the messages containing the phrase.
+        """
+        found = self.find(phrase)
+        return self.sender[found], self.timestamp[found]
+
+    def select(self, where: MessageFilter) -> "TextIndex":
+        """
+        The index of only the messages where selects. Rows still refer to
+        the unfiltered table.
+        """
+        keep = np.ones(len(self.row), dtype=bool)
+        if where.start is not None:
+            keep &= self.timestamp >= where.start
+        if where.end is not None:
+            keep &= self.timestamp < where.end
+        if where.names is not None:
+            keep &= np.isin(self.names, list(where.names))[self.sender]
+        token = np.repeat(np.arange(len(self.tokens)), np.diff(self.offsets))
+        counts = np.bincount(token[keep], minlength=len(self.tokens))
+        return TextIndex(
+            names=self.names,
+            tokens=self.tokens,
+            offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+            row=self.row[keep],
+            position=self.position[keep],
+            sender=self.sender[keep],
+            timestamp=self.timestamp[keep],
+            key=self.key,
+        )
+
+    def save(self, directory: str):
+        tmp = f"{directory.rstrip(os.sep)}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in self.arrays():
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        dictionaries = {name: list(getattr(self, name)) for name in self.DICTIONARIES}
+        with open(os.path.join(tmp, "dictionaries.json"), "w", encoding="utf-8") as f:
+            json.dump({**dictionaries, "key": self.key, "version": self.VERSION}, f)
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(tmp, directory)
+
+    @classmethod
+    def load(cls, directory: str, key: Optional[str] = None) -> Optional["TextIndex"]:
+        """
+        Loads the index saved under directory, or returns None when there is
+        none or, given a key, when it indexes other message files.
+        """
+        path = os.path.join(directory, "dictionaries.json")
+        if not os.path.isfile(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            dictionaries = json.load(f)
+        if dictionaries.get("version") != cls.VERSION:
+            return None
+        if key is not None and dictionaries["key"] != key:
+            return None
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in cls.arrays()
+        }
+        return cls(
+            names=np.array(dictionaries["names"], dtype=object),
+            tokens=np.array(dictionaries["tokens"], dtype=object),
+            key=dictionaries["key"],
+            **arrays,
+        )
@@ -0,0 +1,84 @@
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def default_aliases(participants: List[str]) -> Dict[str, List[str]]:
+    """
+    Every participant is matched by their full name and, when nobody else
+    shares it, by their first name.
+    """
+    firsts = Counter(p.split()[0] for p in participants if p.split())
+    aliases = {}
+    for p in participants:
+        names = [p]
+        first = p.split()[0] if p.split() else ""
+        if first and first != p and firsts[first] == 1:
+            names.append(first)
+        aliases[p] = names
+    return aliases
+
+
+def _alternation(aliases: List[str]) -> str:
+    # longest first, so that a name wins over any alias it starts with
+    ordered = sorted(set(aliases), key=len, reverse=True)
+    return "|".join(re.escape(a) for a in ordered)
+
+
+class MentionMatcher:
+    """
+    Matches every alias of every participant with one compiled alternation,
+    so each message is scanned once regardless of the number of
+    participants. Aliases match on word boundaries, full names and aliases
+    written after an @ case insensitively, first names and nicknames only
+    as written, since many of them are ordinary words too ("will", "may").
+    """
+
+    def __init__(
+        self,
+        participants: List[str],
+        nicknames: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.participants = participants
+        self.aliases = default_aliases(participants)
+        for p, nicks in (nicknames or {}).items():
+            if p in self.aliases:
+                self.aliases[p].extend(nicks)
+
+        self._owner: Dict[str, int] = {}
+        for i, p in enumerate(participants):
+            for alias in self.aliases[p]:
+                self._owner.setdefault(alias.lower(), i)
+        short = [a for p in participants for a in self.aliases[p] if a != p]
+        alternatives = [
+            rf"(?i:{_alternation(participants)})",
+            rf"@(?i:{_alternation(participants + short)})",
+        ]
+        if short:
+            alternatives.append(_alternation(short))
+        self._pattern = re.compile(rf"(?<!\w)(?:{'|'.join(alternatives)})(?!\w)")
+
+    def match(self, text: str) -> List[int]:
+        """
+        Positions in participants of everyone mentioned in text, each at
+        most once.
+        """
+        if not self._owner:
+            return []
+        found = {
+            self._owner[m.lstrip("@").lower()] for m in self._pattern.findall(text)
+        }
+        return sorted(found)
+
+    def match_all(self, texts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Matches each text once and returns CSR (offsets, positions) arrays.
+        """
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        positions: List[int] = []
+        for i, text in enumerate(texts):
+            positions.extend(self.match(text))
+            offsets[i + 1] = len(positions)
+        return offsets, np.array(positions, dtype=np.int64)
@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from metrics.context import ChatContext
+from metrics.text.sketch import SpaceSaving
+from metrics.text.encoding import fix_encoding
+from metrics.text.tokens import bigrams, contains, message_tokens, tokenize
+
+
+@dataclass
+class WordScan:
+    words: List[SpaceSaving]
+    bigrams: List[SpaceSaving]
+    filtered: pd.DataFrame
+
+
+def scan_words(
+    context: ChatContext, filter_words: List[str], capacity: int
+) -> WordScan:
+    """
+    Tokenizes every distinct message text once and, weighted by how many
+    times each participant sent it, feeds per participant word and bigram
+    sketches of the given capacity. The same pass counts the messages each
+    participant sent containing each of the filter words or phrases, unless
+    the chat has a text index to look them up in instead.
+    """
+    participants = context.participants
+    contents = context.state.contents
+    if context.index is not None:
+        phrases = []
+        filtered = _indexed_counts(context, filter_words)
+    else:
+        phrases = [tuple(tokenize(w)) for w in filter_words]
+        filtered = np.zeros((len(participants), len(phrases)), dtype=np.int64)
+
+    words = [SpaceSaving(capacity) for _ in participants]
+    pairs = [SpaceSaving(capacity) for _ in participants]
+    # with an index and no sketches to fill there is nothing to scan
+    if capacity or phrases:
+        counts = context.content_counts
+        previous = -1
+        for code, sender, count in zip(
+            counts["content"].tolist(),
+            counts["sender"].tolist(),
+            counts["count"].tolist(),
+        ):
+            if code != previous:
+                tokens = message_tokens(contents[code])
+                grams = bigrams(tokens)
+                hits = [j for j, p in enumerate(phrases) if p and contains(tokens, p)]
+                previous = code
+            if capacity:
+                for token in tokens:
+                    words[sender].offer(token, count)
+                for gram in grams:
+                    pairs[sender].offer(gram, count)
+            for j in hits:
+                filtered[sender, j] += count
+
+    return WordScan(
+        words=words,
+        bigrams=pairs,
+        filtered=pd.DataFrame(
+            filtered,
+            index=[fix_encoding(p) for p in participants],
+            columns=filter_words,
+        ),
+    )
+
+
+def _indexed_counts(context: ChatContext, filter_words: List[str]) -> np.ndarray:
+    index = context.index
+    # the index covers the whole chat, senders a filter left out of the
+    # state have no position and their hits are dropped
+    code_of = {n: i for i, n in enumerate(context.state.names)}
+    positions = np.array(
+        [
+            context.participant_positions[code_of[n]] if n in code_of else -1
+            for n in index.names
+        ],
+        dtype=np.int64,
+    )
+    filtered = np.zeros((len(context.participants), len(filter_words)), np.int64)
+    for j, word in enumerate(filter_words):
+        senders, _ = index.hits(word)
+        found = positions[senders]
+        filtered[:, j] = np.bincount(
+            found[found >= 0], minlength=len(context.participants)
+        )
+    return filtered
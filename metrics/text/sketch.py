@@ -0,0 +1,46 @@
+import heapq
+from typing import Dict, List, Tuple
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters sketch. Tracks at most capacity items, so
+    memory stays bounded whatever the vocabulary size. A reported count
+    overestimates the true count by at most its error.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+
+    def offer(self, item: str, weight: int = 1):
+        if self.capacity <= 0:
+            return
+        if item in self.counts:
+            self.counts[item] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = 0
+        else:
+            floor, victim = self._pop_min()
+            del self.counts[victim]
+            del self.errors[victim]
+            self.counts[item] = floor + weight
+            self.errors[item] = floor
+        heapq.heappush(self._heap, (self.counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c, i) for i, c in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> Tuple[int, str]:
+        # heap entries go stale whenever an item's count grows
+        while True:
+            count, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return count, item
+
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        items = heapq.nlargest(k, self.counts.items(), key=lambda x: x[1])
+        return [(item, count, self.errors[item]) for item, count in items]
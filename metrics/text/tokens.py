@@ -0,0 +1,29 @@
+import re
+from typing import List, Tuple
+
+from metrics.text.encoding import fix_encoding
+
+TOKEN = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.lower())
+
+
+def message_tokens(content: str) -> List[str]:
+    """
+    Tokens of a message text as exported, decoded first like fix_encoding
+    does so that words with accents or in other scripts come out whole.
+    """
+    return tokenize(fix_encoding(content))
+
+
+def bigrams(tokens: List[str]) -> List[str]:
+    return [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def contains(tokens: List[str], phrase: Tuple[str, ...]) -> bool:
+    n = len(phrase)
+    if n == 1:
+        return phrase[0] in tokens
+    return any(tuple(tokens[i : i + n]) == phrase for i in range(len(tokens) - n + 1))
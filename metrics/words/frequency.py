@@ -0,0 +1,57 @@
+from typing import List
+
+import pandas as pd
+
+from metrics.context import ChatContext
+from metrics.figure import Figure, Table
+from metrics.metric import Metric
+from metrics.options import MetricOptions
+from metrics.text.encoding import fix_encoding
+from metrics.text.scan import scan_words
+from metrics.text.sketch import SpaceSaving
+
+
+class WordFrequency(Metric):
+    OPTIONS = ("filter_words", "top_words")
+    # sketch slots kept per chatter for every top word reported
+    CAPACITY_FACTOR = 10
+
+    name = "word_frequency"
+
+    def __init__(self, context: ChatContext, filter_words: List[str], top: int):
+        super().__init__(context)
+        self.filter_words = filter_words
+        self.top = top
+
+    @classmethod
+    def from_options(
+        cls, context: ChatContext, options: MetricOptions
+    ) -> "WordFrequency":
+        return cls(context, options.filter_words, options.top_words)
+
+    def compute_metric(self) -> List[Figure]:
+        scan = scan_words(
+            self.context, self.filter_words, self.top * self.CAPACITY_FACTOR
+        )
+        figures = [
+            self._top_terms(scan.words, "Word", "top_words_by_chatter"),
+            self._top_terms(scan.bigrams, "Bigram", "top_bigrams_by_chatter"),
+        ]
+        if self.filter_words:
+            figures.append(Table("filter_words_by_chatter", table=scan.filtered))
+        return figures
+
+    def _top_terms(self, sketches: List[SpaceSaving], label: str, title: str) -> Table:
+        rows = [
+            {
+                "Chatter": fix_encoding(p),
+                "Rank": rank + 1,
+                label: term,
+                "Count": count,
+                "Error": error,
+            }
+            for p, sketch in zip(self.context.participants, sketches)
+            for rank, (term, count, error) in enumerate(sketch.top(self.top))
+        ]
+        df = pd.DataFrame(rows, columns=["Chatter", "Rank", label, "Count", "Error"])
+        return Table(title, table=df)
@@ -1,38 +1,114 @@
-import json
+import fnmatch
 import os
-from argparse import ArgumentParser
-from typing import List
+import sys
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from collections import defaultdict
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
-import pandas as pd
-import seaborn as sns
+import profiler
+from metrics.executor import MODES, run_metrics
+from metrics.figure import RenderOptions
+from metrics.options import BUCKETS, MAX_TOP_REACTED, MetricOptions
+from metrics.registry import metric_names
+from metrics.render import Renderer, init_worker
+from profiler import measure
+from status import Status, Timing
 
-from metrics.factory import provide_metric
-from status import Status
+# pandas, the ingest modules and the metrics are imported by the functions
+# using them, so that -h and argument errors return without loading them
+if TYPE_CHECKING:
+    import pandas as pd
 
+    from ingest.columns import MessageFilter
+    from ingest.export import Inbox
+    from ingest.table import MessageTable
+    from metrics.context import ChatContext
+    from metrics.metric import Metric
+    from metrics.results import ResultCache
+    from metrics.state import ChatState
+    from metrics.text.index import TextIndex
 
-METRICS = [
-    "cumulative_activity",
-    "sma_activity",
-    "message_awards",
-    "sender_awards",
-    "reacts",
-]
+INBOX_DIR = "./messages/inbox/"
+STATE_DIR = "state"
+INDEX_DIR = "index"
+QUERY = "query"
+SERVE = "serve"
+GLOB_CHARS = "*?["
 
 
-def construct_argparser() -> ArgumentParser:
-    parser = ArgumentParser()
+def nickname(value: str) -> Tuple[str, str]:
+    name, sep, alias = value.partition("=")
+    if not sep or not name.strip() or not alias.strip():
+        raise ArgumentTypeError(f"expected 'Full Name=nickname', got '{value}'")
+    return name.strip(), alias.strip()
+
+
+def positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        raise ArgumentTypeError(f"expected a positive whole number, got '{value}'")
+    return number
+
+
+def top_reacted(value: str) -> int:
+    number = positive_int(value)
+    if number > MAX_TOP_REACTED:
+        raise ArgumentTypeError(
+            f"at most {MAX_TOP_REACTED} most reacted messages are kept, got '{value}'"
+        )
+    return number
+
+
+def resolution(value: str) -> str:
+    from pandas.tseries.frequencies import to_offset
+
+    try:
+        # times are floored to it, which only fixed frequencies allow
+        to_offset(value).nanos
+    except ValueError:
+        raise ArgumentTypeError(
+            f"expected a fixed frequency such as 1h or 1d, got '{value}'"
+        )
+    return value
+
+
+def timestamp_ms(value: str) -> int:
+    try:
+        return int(datetime.fromisoformat(value).timestamp() * 1000)
+    except ValueError:
+        raise ArgumentTypeError(f"expected a date such as 2023-01-31, got '{value}'")
+
+
+def add_input_arguments(parser: ArgumentParser):
     parser.add_argument(
-        "--chat",
-        required=True,
-        type=str,
-        help="chat name or string that chat name starts with",
+        "--inbox",
+        nargs="+",
+        default=[INBOX_DIR],
+        help=f"Facebook export zip archives or directories to read chats from, {INBOX_DIR} by default",
     )
     parser.add_argument(
-        "--metrics",
-        nargs="*",
-        choices=METRICS,
-        help=f"metrics to compute",
+        "--since",
+        type=timestamp_ms,
+        help="only parse messages sent from this local date or time on, such as 2023-01-31 or 2023-01-31T18:00",
+    )
+    parser.add_argument(
+        "--until",
+        type=timestamp_ms,
+        help="only parse messages sent before this local date or time",
     )
+    parser.add_argument(
+        "--participants",
+        nargs="+",
+        help="only parse messages sent by, and reactions from, these full names",
+    )
+
+
+def add_metric_arguments(parser: ArgumentParser):
     parser.add_argument(
         "--filter-top",
         action="store_true",
@@ -45,88 +121,844 @@ def construct_argparser() -> ArgumentParser:
     )
     parser.add_argument(
         "--filter-word",
-        type=str,
-        help="track how many times a specific word was said in chat",
+        nargs="+",
+        default=[],
+        help="track how many times specific words or phrases were said in chat",
+    )
+    parser.add_argument(
+        "--activity-buckets",
+        nargs="+",
+        choices=BUCKETS,
+        default=["day"],
+        help="time buckets to find the most messages sent in for sender_awards",
+    )
+    parser.add_argument(
+        "--top-common",
+        type=positive_int,
+        default=MetricOptions.top_common,
+        help="number of most common messages for message_awards",
+    )
+    parser.add_argument(
+        "--top-reacted",
+        type=top_reacted,
+        default=MetricOptions.top_reacted,
+        help="number of most reacted messages for message_awards",
+    )
+    parser.add_argument(
+        "--top-words",
+        type=positive_int,
+        default=20,
+        help="number of top words and bigrams per chatter for word_frequency",
+    )
+    parser.add_argument(
+        "--nickname",
+        nargs="+",
+        action="extend",
+        type=nickname,
+        default=[],
+        help="extra alias a chatter is mentioned by, as 'Full Name=nickname'",
     )
     parser.add_argument(
         "--sma-window",
+        nargs="+",
+        type=positive_int,
+        default=[40],
+        help="rolling windows of days for sma_window metric",
+    )
+    parser.add_argument(
+        "--cumulative-resolution",
+        type=resolution,
+        help="time bucket for cumulative_activity such as 1h or 1d",
+    )
+
+
+class QueryArgumentParser(ArgumentParser):
+    """
+    Parses the metric settings requests to the server carry, raising
+    ValueError rather than exiting on invalid ones.
+    """
+
+    def error(self, message: str):
+        raise ValueError(message)
+
+
+def query_options(query: Dict[str, List[str]]) -> MetricOptions:
+    """
+    Metric settings from query parameters named like their command line
+    flags, such as ?filter-word=lol&filter-word=good+night&filter-top
+    """
+    parser = QueryArgumentParser(add_help=False)
+    add_metric_arguments(parser)
+    argv = []
+    for key, values in query.items():
+        argv.append(f"--{key.replace('_', '-')}")
+        argv += [v for v in values if v]
+    return metric_options(parser.parse_args(argv))
+
+
+def construct_argparser() -> ArgumentParser:
+    parser = ArgumentParser(
+        epilog=f"run 'parse.py {QUERY} -h' to look up words in a chat's messages "
+        f"and 'parse.py {SERVE} -h' to serve chats' metrics over HTTP"
+    )
+    chats = parser.add_mutually_exclusive_group(required=True)
+    chats.add_argument(
+        "--chat",
+        nargs="+",
+        type=str,
+        help="chat names, strings chat names start with, or glob patterns such as 'family*'",
+    )
+    chats.add_argument(
+        "--all",
+        action="store_true",
+        help="compute metrics for every chat in the inbox",
+    )
+    add_input_arguments(parser)
+    parser.add_argument(
+        "--metrics",
+        nargs="*",
+        choices=metric_names(),
+        help=f"metrics to compute, every one by default",
+    )
+    add_metric_arguments(parser)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of workers used to parse message files and compute metrics",
+    )
+    parser.add_argument(
+        "--parallel",
+        choices=MODES,
+        default="none",
+        help="compute metrics concurrently on a pool of threads or processes",
+    )
+    parser.add_argument(
+        "--metric-timeout",
+        type=float,
+        help="seconds a metric may run for before it is reported as failed",
+    )
+    parser.add_argument(
+        "--format",
+        choices=RenderOptions.FORMATS,
+        default=RenderOptions.format,
+        help="file format charts are written in",
+    )
+    parser.add_argument(
+        "--dpi",
+        type=float,
+        help="resolution charts are written at, defaults to the figure dpi times zoom",
+    )
+    parser.add_argument(
+        "--zoom",
+        type=float,
+        default=RenderOptions.zoom,
+        help="factor charts are scaled up by before they are written",
+    )
+    parser.add_argument(
+        "--render-jobs",
+        type=int,
+        default=1,
+        help="number of processes writing charts while metrics compute, 0 to write them inline",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="./profile.json",
+        help="write the time, memory and rows of every stage to a JSON report, ./profile.json by default",
+    )
+    parser.add_argument(
+        "--cprofile-dir",
+        type=str,
+        help="directory to dump cProfile stats of every metric's computation to",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="directory where parsed chats and metric results are cached, ./.cache by default",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse message files and compute metrics without reading or writing the cache",
+    )
+    parser.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="ignore any cached parse, incremental state or metric result of the chat and overwrite it",
+    )
+    parser.add_argument(
+        "--result-cache-size",
+        type=float,
+        default=256,
+        help="megabytes of metric results kept in the cache, least recently used first out, 256 by default",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only parse messages newer than the last incremental run and fold them into its saved state",
+    )
+    return parser
+
+
+def construct_query_argparser() -> ArgumentParser:
+    parser = ArgumentParser(
+        prog=f"parse.py {QUERY}",
+        description="count the messages of a chat that contain words or phrases, "
+        "using the chat's text index, which is built on first use",
+    )
+    parser.add_argument("phrases", nargs="+", help="words or phrases to look up")
+    parser.add_argument(
+        "--chat",
+        type=str,
+        required=True,
+        help="chat name, or a string the chat name starts with",
+    )
+    add_input_arguments(parser)
+    parser.add_argument(
+        "--bucket",
+        choices=BUCKETS,
+        default="month",
+        help="time bucket to count matching messages by, month by default",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of workers used to parse message files when building the index",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="directory where parsed chats and their indexes are cached, ./.cache by default",
+    )
+    return parser
+
+
+def construct_serve_argparser() -> ArgumentParser:
+    parser = ArgumentParser(
+        prog=f"parse.py {SERVE}",
+        description="keep chats parsed in memory and serve their metrics over "
+        "HTTP, tables as JSON and charts as PNG, reloading a chat when its "
+        "message files change",
+    )
+    chats = parser.add_mutually_exclusive_group(required=True)
+    chats.add_argument(
+        "--chat",
+        nargs="+",
+        type=str,
+        help="chat names, strings chat names start with, or glob patterns such as 'family*'",
+    )
+    chats.add_argument(
+        "--all",
+        action="store_true",
+        help="serve every chat in the inbox",
+    )
+    add_input_arguments(parser)
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="address to listen on, 127.0.0.1 by default",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help="port to listen on, 8000 by default",
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        help="path of a Unix socket to listen on instead of --host and --port",
+    )
+    parser.add_argument(
+        "--jobs",
         type=int,
-        default=40,
-        help="rolling window of days for sma_window metric",
+        default=4,
+        help="number of requests handled at once, 4 by default",
+    )
+    parser.add_argument(
+        "--poll",
+        type=float,
+        default=2,
+        help="seconds between checks for changed message files, 0 to never reload, 2 by default",
+    )
+    parser.add_argument(
+        "--dpi",
+        type=float,
+        help="resolution charts are rendered at, defaults to the figure dpi times zoom",
+    )
+    parser.add_argument(
+        "--zoom",
+        type=float,
+        default=RenderOptions.zoom,
+        help="factor charts are scaled up by before they are rendered",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="directory where parsed chats and their indexes are cached, ./.cache by default",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse message files without reading or writing the cache",
     )
     return parser
 
 
-def generate_df(path: str) -> pd.DataFrame:
+def generate_df(path: str) -> "pd.DataFrame":
+    from ingest.columns import read_columns
+    from ingest.table import MessageTable
+
     print(f"parsing {path}")
-    with open(path, "r") as f:
-        meta = json.load(f)
+    return MessageTable.from_columns(read_columns(path)).to_frame()
 
-    rows = []
-    for msg in meta["messages"]:
-        row = {"sender": msg["sender_name"], "timestamp": msg["timestamp_ms"]}
-        if "content" in msg:
-            row["content"] = msg["content"]
-        if "photos" in msg:
-            row["photos"] = msg["photos"]
-        if "reactions" in msg:
-            row["reactors"] = [r["actor"] for r in msg["reactions"]]
-        rows.append(row)
 
-    return pd.DataFrame(rows)
+def open_inbox(sources: Optional[List[str]] = None) -> "Inbox":
+    from ingest.export import Inbox
 
+    return Inbox.index(sources or [INBOX_DIR])
 
-def parse_messages(chat: str) -> pd.DataFrame:
-    candidates = [c for c in os.listdir("./messages/inbox/") if c.startswith(chat)]
+
+def find_chat(chat: str, inbox: "Inbox") -> Tuple[str, List[str]]:
+    """
+    Returns the inbox directory name of the chat and its message files.
+    """
+    if chat in inbox.chats:
+        candidates = [chat]
+    else:
+        candidates = [c for c in inbox.names() if c.startswith(chat)]
     if not len(candidates):
         raise Exception(f"No chat starting with {chat} found in inbox")
     if len(candidates) > 1:
         raise Exception("Input amore unique chat name than")
+    return candidates[0], inbox.chats[candidates[0]]
+
+
+def is_glob(pattern: str) -> bool:
+    return any(c in pattern for c in GLOB_CHARS)
+
+
+def find_chats(patterns: Optional[List[str]], inbox: "Inbox") -> List[str]:
+    """
+    Inbox directory names of the chats matching any of the patterns, or of
+    every chat without patterns. Patterns that are not globs must match
+    exactly one chat, like --chat always has.
+    """
+    if not patterns:
+        return inbox.names()
+
+    chats = []
+    for pattern in patterns:
+        if not is_glob(pattern):
+            chats.append(find_chat(pattern.lower(), inbox)[0])
+            continue
+        matched = fnmatch.filter(inbox.names(), pattern.lower())
+        if not matched:
+            raise Exception(f"No chat matching {pattern} found in inbox")
+        chats += matched
+    return list(dict.fromkeys(chats))
+
+
+def discover(
+    chat: str, inbox: Optional["Inbox"], timings: List[Timing]
+) -> Tuple[str, List[str]]:
+    with measure("discover") as timing:
+        timings.append(timing)
+        name, files = find_chat(chat, inbox or open_inbox())
+        timing.rows = len(files)
+    return name, files
+
+
+def read_table(
+    files: List[str],
+    jobs: int = 1,
+    where: Optional["MessageFilter"] = None,
+    timings: Optional[List[Timing]] = None,
+) -> "MessageTable":
+    from ingest.columns import prune_files, read_files
+    from ingest.merge import merge_columns
+    from ingest.table import MessageTable
+
+    timings = [] if timings is None else timings
+    if where is not None and where.windowed:
+        with measure("prune") as timing:
+            timings.append(timing)
+            files = prune_files(files, where)
+            timing.rows = len(files)
+    parts = read_files(files, jobs, where, timings)
+    with measure("merge") as timing:
+        timings.append(timing)
+        table = MessageTable.from_columns(merge_columns(parts))
+        timing.rows = len(table)
+    return table
+
 
-    path = f"./messages/inbox/{candidates[0]}/"
-    files = [path + f for f in os.listdir(path) if f.startswith("message")]
+def parse_messages(
+    chat: str,
+    jobs: int = 1,
+    cache_dir: Optional[str] = None,
+    rebuild_cache: bool = False,
+    timings: Optional[List[Timing]] = None,
+    inbox: Optional["Inbox"] = None,
+    where: Optional["MessageFilter"] = None,
+) -> "MessageTable":
+    """
+    Parses every message of the chat, or loads them from the cache. The chat
+    is looked up in inbox, or in ./messages/inbox/ without one. With where,
+    only the messages it selects are parsed, skipping the cache which holds
+    whole chats. The time taken by each stage is appended to timings when
+    given.
+    """
+    from ingest import cache
 
-    dfs = [generate_df(f) for f in files]
-    merged = pd.concat(dfs, ignore_index=True, sort=False)
-    return merged.sort_values("timestamp")
+    timings = [] if timings is None else timings
+    name, files = discover(chat, inbox, timings)
+    if where is not None:
+        table = read_table(files, jobs, where, timings)
+        if not len(table):
+            raise Exception(f"No message of {name} matches the filters")
+        return table
+    if cache_dir is None:
+        return read_table(files, jobs, timings=timings)
+
+    directory = os.path.join(cache_dir, name)
+    key = cache.fingerprint(files)
+    if not rebuild_cache:
+        with measure("load cache") as timing:
+            timings.append(timing)
+            table = cache.load(directory, key)
+            timing.rows = None if table is None else len(table)
+        if table is not None:
+            print(f"loaded {name} from cache")
+            return table
+
+    table = read_table(files, jobs, timings=timings)
+    with measure("store cache", rows=len(table)) as timing:
+        timings.append(timing)
+        os.makedirs(directory, exist_ok=True)
+        cache.store(directory, key, table)
+    return table
+
+
+def update_state(
+    chat: str,
+    jobs: int = 1,
+    cache_dir: Optional[str] = None,
+    rebuild: bool = False,
+    timings: Optional[List[Timing]] = None,
+    inbox: Optional["Inbox"] = None,
+) -> "ChatState":
+    """
+    Parses only the messages sent after the chat's saved state was last
+    updated, folds them into the state and saves it again. The state is
+    kept under the cache directory, ingest.cache.CACHE_DIR by default.
+    """
+    from ingest import cache
+    from ingest.columns import MessageFilter
+    from metrics.state import ChatState
+
+    cache_dir = cache_dir or cache.CACHE_DIR
+    timings = [] if timings is None else timings
+    name, files = discover(chat, inbox, timings)
+    directory = os.path.join(cache_dir, STATE_DIR, name)
+    with measure("load state") as timing:
+        timings.append(timing)
+        state = None if rebuild else ChatState.load(directory)
+    where = None if state is None else MessageFilter(start=state.watermark + 1)
+
+    table = read_table(files, jobs, where, timings)
+    print(f"folding {len(table)} new messages into {name}")
+    with measure("fold state", rows=len(table)) as timing:
+        timings.append(timing)
+        update = ChatState.from_table(table)
+        state = update if state is None else state.merge(update)
+    with measure("save state") as timing:
+        timings.append(timing)
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        state.save(directory)
+    return state
+
+
+def load_index(
+    chat: str, cache_dir: str, timings: List[Timing], inbox: Optional["Inbox"] = None
+) -> Optional["TextIndex"]:
+    """
+    The chat's text index, when one was built from its current message files.
+    """
+    from ingest import cache
+    from metrics.text.index import TextIndex
+
+    name, files = find_chat(chat, inbox or open_inbox())
+    with measure("load index") as timing:
+        timings.append(timing)
+        directory = os.path.join(cache_dir, INDEX_DIR, name)
+        index = TextIndex.load(directory, cache.fingerprint(files))
+        timing.rows = None if index is None else len(index.row)
+    return index
+
+
+def build_index(
+    chat: str,
+    jobs: int,
+    cache_dir: str,
+    timings: List[Timing],
+    inbox: Optional["Inbox"] = None,
+) -> "TextIndex":
+    """
+    Loads the chat's text index, or builds it from the parsed chat and saves
+    it next to the parse cache when its message files have changed.
+    """
+    from ingest import cache
+    from metrics.text.index import TextIndex
+
+    index = load_index(chat, cache_dir, timings, inbox)
+    if index is not None:
+        return index
+    table = parse_messages(chat, jobs, cache_dir, timings=timings, inbox=inbox)
+    name, files = find_chat(chat, inbox or open_inbox())
+    with measure("build index", rows=len(table)) as timing:
+        timings.append(timing)
+        index = TextIndex.from_table(table, cache.fingerprint(files))
+    with measure("save index") as timing:
+        timings.append(timing)
+        index.save(os.path.join(cache_dir, INDEX_DIR, name))
+    return index
 
 
 def output_status(statuses: List[Status]):
     for s in statuses:
+        wall = sum(t.wall for t in s.timings)
+        took = f" in {wall:.2f}s" if s.timings else ""
         if not s.success:
-            print(f"Metric '{s.metric}' failed: {s.message}")
+            print(f"Metric '{s.metric}' failed{took}: {s.message}")
         else:
-            print(f"Metric '{s.metric}' succeeded")
+            print(f"Metric '{s.metric}' succeeded{took}")
 
 
 def setup():
-    pd.options.mode.chained_assignment = None
-    sns.set()
-    if not os.path.exists("./figures"):
-        os.makedirs("./figures")
+    init_worker()
+    if not os.path.exists(RenderOptions.directory):
+        os.makedirs(RenderOptions.directory)
+
+
+def load_context(
+    chat: str, args: Namespace, jobs: int, timings: List[Timing], inbox: "Inbox"
+) -> "ChatContext":
+    from ingest import cache
+    from metrics.context import ChatContext
+
+    cache_dir = args.cache_dir or cache.CACHE_DIR
+    where = message_filter(args)
+    index = None
+    # --filter-word counts are looked up in the index when there is one
+    if args.filter_word and not args.no_cache:
+        index = load_index(chat, cache_dir, timings, inbox)
+        if index is not None and where is not None:
+            index = index.select(where)
+    if args.incremental:
+        state = update_state(
+            chat,
+            jobs=jobs,
+            cache_dir=cache_dir,
+            rebuild=args.rebuild_cache,
+            timings=timings,
+            inbox=inbox,
+        )
+        return ChatContext(state, index=index)
+    table = parse_messages(
+        chat,
+        jobs=jobs,
+        cache_dir=None if args.no_cache else cache_dir,
+        rebuild_cache=args.rebuild_cache,
+        timings=timings,
+        inbox=inbox,
+        where=where,
+    )
+    with measure("state", rows=len(table)) as timing:
+        timings.append(timing)
+        return ChatContext.from_table(table, index)
+
+
+def message_filter(args: Namespace) -> Optional["MessageFilter"]:
+    from ingest.columns import MessageFilter
+
+    if args.since is None and args.until is None and not args.participants:
+        return None
+    return MessageFilter(
+        start=args.since,
+        end=args.until,
+        participants=frozenset(args.participants) if args.participants else None,
+    )
+
+
+def metric_options(args: Namespace) -> MetricOptions:
+    nicknames = defaultdict(list)
+    for name, alias in args.nickname:
+        nicknames[name].append(alias)
+    return MetricOptions(
+        filter_top=args.filter_top,
+        filter_bottom=args.filter_bottom,
+        filter_words=list(dict.fromkeys(args.filter_word)),
+        windows=args.sma_window,
+        cumulative_resolution=args.cumulative_resolution,
+        nicknames=dict(nicknames),
+        top_words=args.top_words,
+        top_common=args.top_common,
+        top_reacted=args.top_reacted,
+        activity_buckets=args.activity_buckets,
+    )
+
+
+def build_metrics(context: "ChatContext", args: Namespace) -> List["Metric"]:
+    from metrics.factory import provide_metric
+
+    options = metric_options(args)
+    return [
+        provide_metric(name=n, context=context, **vars(options))
+        for n in args.metrics or metric_names()
+    ]
+
+
+def result_cache(chat: str, args: Namespace, inbox: "Inbox") -> Optional["ResultCache"]:
+    """
+    Cache of the chat's metric results, keyed on its message files along
+    with the filters and the mode they were read with. None with --no-cache.
+    """
+    from ingest import cache
+    from metrics.results import RESULTS_DIR, ResultCache
+
+    if args.no_cache:
+        return None
+    _, files = find_chat(chat, inbox)
+    data = {
+        "files": cache.fingerprint(files),
+        "since": args.since,
+        "until": args.until,
+        "participants": sorted(args.participants or []),
+        "incremental": args.incremental,
+    }
+    return ResultCache(
+        os.path.join(args.cache_dir or cache.CACHE_DIR, RESULTS_DIR),
+        data,
+        metric_options(args),
+        max_bytes=int(args.result_cache_size * 1024 * 1024),
+        rebuild=args.rebuild_cache,
+    )
+
+
+def render_options(args: Namespace) -> RenderOptions:
+    return RenderOptions(format=args.format, dpi=args.dpi, zoom=args.zoom)
+
+
+def profile_dir(args: Namespace, chat: Optional[str] = None) -> Optional[str]:
+    if args.cprofile_dir is None:
+        return None
+    directory = os.path.join(args.cprofile_dir, chat or "")
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+@dataclass
+class ChatRun:
+    statuses: List[Status]
+    stages: List[Timing]
+    message_counts: "pd.Series"
+    monthly_counts: "pd.Series"
+
+
+def run_chat(chat: str, args: Namespace, inbox: "Inbox") -> ChatRun:
+    """
+    Computes the metrics of one chat of a batch run, writing its figures to
+    a directory of its own. Returns the statuses along with the messages
+    sent per participant and per month for the inbox summary.
+    """
+    directory = os.path.join(RenderOptions.directory, chat)
+    os.makedirs(directory, exist_ok=True)
+    stages = []
+    context = load_context(chat, args, jobs=1, timings=stages, inbox=inbox)
+    renderer = Renderer(
+        replace(render_options(args), directory=directory), jobs=args.render_jobs
+    )
+    statuses = run_metrics(
+        build_metrics(context, args),
+        renderer,
+        mode=args.parallel,
+        jobs=args.jobs,
+        timeout=args.metric_timeout,
+        profile_dir=profile_dir(args, chat),
+        results=result_cache(chat, args, inbox),
+    )
+    return ChatRun(
+        statuses=[replace(s, metric=f"{chat}/{s.metric}") for s in statuses],
+        stages=[replace(t, stage=f"{chat}/{t.stage}") for t in stages],
+        message_counts=context.message_counts,
+        monthly_counts=context.bucket_counts("month").sum(axis=1),
+    )
+
+
+def run_batch(
+    chats: List[str], args: Namespace, stages: List[Timing], inbox: "Inbox"
+) -> List[Status]:
+    """
+    Runs every chat on a pool of --jobs processes, one chat per task, then
+    writes the inbox summary. Tasks only carry the index of their own chat.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from metrics.inbox import InboxSummary
+
+    if args.jobs <= 1 or len(chats) <= 1:
+        pool = None
+        futures = []
+    else:
+        pool = ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker)
+        futures = [pool.submit(run_chat, c, args, inbox.subset([c])) for c in chats]
+
+    statuses = []
+    summary = InboxSummary()
+    for i, chat in enumerate(chats):
+        try:
+            run = futures[i].result() if pool else run_chat(chat, args, inbox)
+        except Exception as e:
+            statuses.append(Status(metric=chat, success=False, message=str(e)))
+            continue
+        statuses += run.statuses
+        stages += run.stages
+        summary.add(chat, run.message_counts, run.monthly_counts)
+    if pool:
+        pool.shutdown()
+
+    renderer = Renderer(render_options(args))
+    renderer.submit("inbox_summary", summary.figures())
+    error = renderer.wait().get("inbox_summary")
+    statuses.append(
+        Status(
+            metric="inbox_summary",
+            success=error is None,
+            message=error or "",
+            timings=renderer.timings["inbox_summary"],
+        )
+    )
+    return statuses
+
+
+def run_query(args: Namespace):
+    import pandas as pd
+
+    from ingest import cache
+    from metrics.context import bucket_starts
+    from metrics.state import local_times
+
+    inbox = open_inbox(args.inbox)
+    cache_dir = args.cache_dir or cache.CACHE_DIR
+    index = build_index(args.chat, args.jobs, cache_dir, [], inbox)
+    where = message_filter(args)
+    if where is not None:
+        index = index.select(where)
+
+    for phrase in args.phrases:
+        with measure(f"query {phrase}") as timing:
+            senders, timestamps = index.hits(phrase)
+            names = pd.Series(index.names[senders], name="Sender")
+            starts = pd.Series(
+                bucket_starts(local_times(timestamps), args.bucket), name=args.bucket
+            )
+            by_sender = names.value_counts().rename("Messages")
+            over_time = pd.crosstab(starts, names)
+        print(
+            f"'{phrase}' is in {len(senders)} messages, "
+            f"looked up in {timing.wall * 1000:.1f}ms"
+        )
+        if len(senders):
+            print(by_sender.to_string())
+            print(over_time.to_string())
+
+
+def run_serve(args: Namespace):
+    from ingest import cache
+    from metrics.context import ChatContext
+    from server import ChatServer, serve
+
+    init_worker()
+    cache_dir = None if args.no_cache else args.cache_dir or cache.CACHE_DIR
+    where = message_filter(args)
+
+    def fingerprints(chats: List[str]) -> Dict[str, str]:
+        inbox = open_inbox(args.inbox)
+        return {c: cache.fingerprint(inbox.chats[c]) for c in chats if c in inbox.chats}
+
+    def load(chat: str) -> Tuple[str, "ChatContext"]:
+        inbox = open_inbox(args.inbox)
+        _, files = find_chat(chat, inbox)
+        version = cache.fingerprint(files)
+        table = parse_messages(chat, args.jobs, cache_dir, inbox=inbox, where=where)
+        index = None if cache_dir is None else load_index(chat, cache_dir, [], inbox)
+        if index is not None and where is not None:
+            index = index.select(where)
+        return version, ChatContext.from_table(table, index)
+
+    chats = find_chats(None if args.all else args.chat, open_inbox(args.inbox))
+    app = ChatServer(
+        chats,
+        load,
+        fingerprints,
+        query_options,
+        RenderOptions(dpi=args.dpi, zoom=args.zoom),
+        poll=args.poll,
+    )
+    serve(app, args.jobs, args.host, args.port, args.socket)
 
 
 def main():
-    setup()
+    if sys.argv[1:2] == [QUERY]:
+        run_query(construct_query_argparser().parse_args(sys.argv[2:]))
+        return
+    if sys.argv[1:2] == [SERVE]:
+        run_serve(construct_serve_argparser().parse_args(sys.argv[2:]))
+        return
     parser = construct_argparser()
     args = parser.parse_args()
-
-    df = parse_messages(args.chat.lower())
-    names = args.metrics or METRICS
-    metrics = [
-        provide_metric(
-            name=n,
-            messages=df.copy(deep=True),
-            filter_top=args.filter_top,
-            filter_bottom=args.filter_bottom,
-            filter_word=args.filter_word,
-            window=args.sma_window,
+    if args.incremental and message_filter(args) is not None:
+        parser.error(
+            "--since, --until and --participants can't be used with --incremental"
         )
-        for n in names
-    ]
+    setup()
+    if args.profile:
+        profiler.start()
 
-    statuses = [m.compute() for m in metrics]
+    stages = []
+    with measure("total") as total:
+        with measure("index") as timing:
+            stages.append(timing)
+            inbox = open_inbox(args.inbox)
+            timing.rows = len(inbox)
+        chats = find_chats(None if args.all else args.chat, inbox)
+        if not chats:
+            parser.exit(1, f"No chats found in {' '.join(args.inbox)}\n")
+        if args.all or len(args.chat) > 1 or is_glob(args.chat[0]):
+            statuses = run_batch(chats, args, stages, inbox)
+        else:
+            context = load_context(
+                chats[0], args, jobs=args.jobs, timings=stages, inbox=inbox
+            )
+            renderer = Renderer(render_options(args), jobs=args.render_jobs)
+            statuses = run_metrics(
+                build_metrics(context, args),
+                renderer,
+                mode=args.parallel,
+                jobs=args.jobs,
+                timeout=args.metric_timeout,
+                profile_dir=profile_dir(args),
+                results=result_cache(chats[0], args, inbox),
+            )
     output_status(statuses)
+    if args.profile:
+        profiler.write_report(args.profile, stages + [total], statuses)
+        print(f"wrote profile to {args.profile}")
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from status import Status, Timing
+
+
+@dataclass(eq=False)
+class _Open:
+    timing: Timing
+    # memory traced when the stage started and the most traced since
+    start: int
+    peak: int
+
+
+# stages being measured, outermost first, whose peaks must include the peaks
+# of the stages nested in them since every stage resets the traced peak
+_open: List[_Open] = []
+
+
+def start():
+    """
+    Turns on memory tracing for this process and for any worker process
+    started from now on.
+    """
+    os.environ["PYTHONTRACEMALLOC"] = "1"
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def _max_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+@contextmanager
+def measure(stage: str, rows: Optional[int] = None) -> Iterator[Timing]:
+    """
+    Times the body of the with statement. The yielded Timing is filled in
+    when the body exits, and its rows may be set from within the body.
+    """
+    timing = Timing(stage=stage, rows=rows)
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        allocated = tracemalloc.get_traced_memory()[0]
+        entry = _Open(timing, allocated, allocated)
+        _open.append(entry)
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield timing
+    finally:
+        timing.wall = time.perf_counter() - wall
+        timing.cpu = time.thread_time() - cpu
+        if tracing:
+            _open.remove(entry)
+            peak = max(tracemalloc.get_traced_memory()[1], entry.peak)
+            # what the stage allocated on top of what it started with, so
+            # stages compare across runs whatever was allocated before them
+            timing.peak_memory = peak - entry.start
+            for outer in _open:
+                outer.peak = max(outer.peak, peak)
+        timing.max_rss = _max_rss()
+
+
+def write_report(path: str, stages: List[Timing], statuses: List[Status]):
+    report = {
+        "stages": [asdict(t) for t in stages],
+        "metrics": [
+            {
+                "metric": s.metric,
+                "success": s.success,
+                "timings": [asdict(t) for t in s.timings],
+            }
+            for s in statuses
+        ],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
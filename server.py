@@ -0,0 +1,314 @@
+import json
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import UnixStreamServer
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from metrics.figure import Chart, Figure, RenderOptions, Table
+from metrics.options import MetricOptions
+from metrics.registry import metric_names
+
+if TYPE_CHECKING:
+    from metrics.context import ChatContext
+
+# figures of this many metric computations are kept in memory
+FIGURE_CACHE = 64
+CONTENT_TYPES = {
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Response:
+    status: int
+    content_type: str
+    body: bytes
+
+    @classmethod
+    def json(cls, value, status: int = 200) -> "Response":
+        return cls(status, CONTENT_TYPES["json"], json.dumps(value).encode())
+
+
+@dataclass
+class LoadedChat:
+    # fingerprint of the message files the context was built from
+    version: str
+    context: "ChatContext"
+
+
+def _table_json(table: Table) -> dict:
+    data = json.loads(table.table.to_json(orient="split", date_format="iso"))
+    return {"title": table.title, "kind": "table", **data}
+
+
+class ChatServer:
+    """
+    Keeps chats parsed in memory and computes their metrics on request.
+    load returns the fingerprint of a chat's message files along with its
+    context, fingerprints those of every given chat, missing the chats no
+    longer found, from one listing of the inbox. A thread polls fingerprints
+    every poll seconds and reloads the chats whose files changed, serving
+    the old context until the new one is ready. Figures are kept for the last
+    FIGURE_CACHE metric computations, so a chart requested after its
+    metric's listing isn't computed again.
+
+    GET /                                   chats and metrics
+    GET /chats/<chat>/<metric>              tables as JSON and chart links
+    GET /chats/<chat>/<metric>/<title>.png  a chart, or .svg
+    GET /chats/<chat>/<metric>/<title>.csv  a table, or .json
+
+    Metric settings are query parameters named like their command line
+    flags, see options.
+    """
+
+    def __init__(
+        self,
+        chats: List[str],
+        load: Callable[[str], Tuple[str, "ChatContext"]],
+        fingerprints: Callable[[List[str]], Dict[str, str]],
+        options: Callable[[Dict[str, List[str]]], MetricOptions],
+        render: RenderOptions = RenderOptions(),
+        poll: Optional[float] = None,
+    ):
+        self.load = load
+        self.fingerprints = fingerprints
+        self.options = options
+        self.render = render
+        self._lock = threading.Lock()
+        self._chats: Dict[str, LoadedChat] = {}
+        for chat in chats:
+            self._chats[chat] = LoadedChat(*load(chat))
+        self._figures: "OrderedDict[tuple, List[Figure]]" = OrderedDict()
+        self._stopped = threading.Event()
+        if poll:
+            threading.Thread(target=self._watch, args=(poll,), daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _watch(self, poll: float):
+        while not self._stopped.wait(poll):
+            chats = dict(self._chats)
+            try:
+                versions = self.fingerprints(list(chats))
+            except Exception as e:
+                print(f"could not list the inbox: {e}")
+                continue
+            for chat, loaded in chats.items():
+                if versions.get(chat) == loaded.version:
+                    continue
+                try:
+                    print(f"reloading {chat}")
+                    reloaded = LoadedChat(*self.load(chat))
+                except Exception as e:
+                    # e.g. an export being replaced, try again on next poll
+                    print(f"could not reload {chat}: {e}")
+                    continue
+                with self._lock:
+                    self._chats[chat] = reloaded
+
+    def respond(self, url: str) -> Response:
+        try:
+            return self._respond(url)
+        except RequestError as e:
+            return Response.json({"error": str(e)}, e.status)
+        except Exception as e:
+            traceback.print_exc()
+            return Response.json({"error": str(e)}, 500)
+
+    def _respond(self, url: str) -> Response:
+        parts = urlsplit(url)
+        path = [unquote(p) for p in parts.path.split("/") if p]
+        query = parse_qs(parts.query, keep_blank_values=True)
+        if not path:
+            return Response.json(self._listing())
+        if path[0] != "chats" or not 3 <= len(path) <= 4:
+            raise RequestError(404, f"No resource at {parts.path}")
+        chat, metric = path[1], path[2]
+        figures = self._compute(chat, metric, query)
+        if len(path) == 3:
+            return Response.json(
+                {
+                    "chat": chat,
+                    "metric": metric,
+                    "figures": [
+                        self._describe(f, parts.path, parts.query) for f in figures
+                    ],
+                }
+            )
+        return self._file(figures, path[3])
+
+    def _listing(self) -> dict:
+        with self._lock:
+            chats = dict(self._chats)
+        return {
+            "chats": [
+                {
+                    "name": name,
+                    "messages": len(loaded.context),
+                    "participants": list(loaded.context.participants),
+                }
+                for name, loaded in chats.items()
+            ],
+            "metrics": metric_names(),
+        }
+
+    def _describe(self, figure: Figure, path: str, query: str) -> dict:
+        if isinstance(figure, Table):
+            return _table_json(figure)
+        url = f"{path.rstrip('/')}/{quote(figure.title)}.{self.render.format}"
+        return {
+            "title": figure.title,
+            "kind": "chart",
+            "url": f"{url}?{query}" if query else url,
+        }
+
+    def _compute(
+        self, chat: str, metric: str, query: Dict[str, List[str]]
+    ) -> List[Figure]:
+        from metrics.factory import provide_metric
+
+        with self._lock:
+            loaded = self._chats.get(chat)
+        if loaded is None:
+            raise RequestError(404, f"Chat {chat} isn't served")
+        if metric not in metric_names():
+            raise RequestError(404, f"Unsupported metric name {metric}")
+        try:
+            options = self.options(query)
+        except ValueError as e:
+            raise RequestError(400, str(e))
+
+        m = provide_metric(name=metric, context=loaded.context, **vars(options))
+        key = (
+            chat,
+            loaded.version,
+            metric,
+            json.dumps(m.parameters(options), sort_keys=True, default=str),
+        )
+        with self._lock:
+            figures = self._figures.get(key)
+            if figures is not None:
+                self._figures.move_to_end(key)
+                return figures
+        status, figures = m.compute()
+        if not status.success:
+            raise RequestError(500, status.message)
+        with self._lock:
+            self._figures[key] = figures
+            while len(self._figures) > FIGURE_CACHE:
+                self._figures.popitem(last=False)
+        return figures
+
+    def _file(self, figures: List[Figure], name: str) -> Response:
+        title, _, ext = name.rpartition(".")
+        figure = next((f for f in figures if f.title == title), None)
+        if figure is None:
+            raise RequestError(404, f"No figure {title}")
+        if isinstance(figure, Chart) and ext in RenderOptions.FORMATS:
+            body = figure.render(replace(self.render, format=ext))
+        elif isinstance(figure, Table) and ext == "csv":
+            body = figure.table.to_csv().encode()
+        elif isinstance(figure, Table) and ext == "json":
+            body = json.dumps(_table_json(figure)).encode()
+        else:
+            raise RequestError(404, f"{title} can't be served as {ext}")
+        return Response(200, CONTENT_TYPES[ext], body)
+
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    server: "_PooledServer"
+
+    def do_GET(self):
+        response = self.server.app.respond(self.path)
+        self.send_response(response.status)
+        self.send_header("Content-Type", response.content_type)
+        self.send_header("Content-Length", str(len(response.body)))
+        self.end_headers()
+        self.wfile.write(response.body)
+
+    def address_string(self) -> str:
+        # clients of a Unix socket have no address
+        return self.client_address[0] if self.client_address else "local"
+
+
+class _PooledServer:
+    """
+    Handles every request on a fixed pool of threads, where ThreadingMixIn
+    would start a thread per request.
+    """
+
+    app: ChatServer
+    # set once the server is bound, which may fail
+    pool: Optional[ThreadPoolExecutor] = None
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+class PooledHTTPServer(_PooledServer, HTTPServer):
+    pass
+
+
+class PooledUnixHTTPServer(_PooledServer, UnixStreamServer):
+    pass
+
+
+def serve(
+    app: ChatServer,
+    jobs: int,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    socket: Optional[str] = None,
+):
+    """
+    Serves app over HTTP on host and port, or on a Unix socket at socket,
+    until interrupted.
+    """
+    if socket is None:
+        server = PooledHTTPServer((host, port), ChatRequestHandler)
+        print(f"serving on http://{host}:{server.server_address[1]}/")
+    else:
+        if os.path.exists(socket):  # left behind by a server that was killed
+            os.remove(socket)
+        server = PooledUnixHTTPServer(socket, ChatRequestHandler)
+        print(f"serving on {socket}")
+    server.app = app
+    server.pool = ThreadPoolExecutor(max_workers=max(jobs, 1))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.stop()
+        server.server_close()
+        if socket is not None:
+            os.remove(socket)
@@ -1,4 +1,23 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class Timing:
+    """
+    Cost of one stage of a run. cpu is the time spent by the thread that ran
+    the stage. peak_memory is the most memory allocated through Python at
+    once during the stage, beyond what was allocated when it started, and is
+    only measured while profiling, max_rss is the peak resident set size of
+    the process so far.
+    """
+
+    stage: str
+    wall: float = 0.0
+    cpu: float = 0.0
+    peak_memory: Optional[int] = None
+    max_rss: Optional[int] = None
+    rows: Optional[int] = None
 
 
 @dataclass
@@ -6,3 +25,4 @@ class Status:
     metric: str
     success: bool
     message: str = ""
+    timings: List[Timing] = field(default_factory=list)
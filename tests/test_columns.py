@@ -0,0 +1,44 @@
+import json
+
+from ingest.columns import MessageFilter, prune_files, read_columns
+
+
+def _write(tmp_path, timestamps, number=1):
+    path = tmp_path / f"message_{number}.json"
+    path.write_text(
+        json.dumps(
+            {
+                "participants": [{"name": "Alice Smith"}],
+                "messages": [
+                    {"sender_name": "Alice Smith", "timestamp_ms": t, "type": "Generic"}
+                    for t in timestamps
+                ],
+            }
+        ),
+        encoding="utf-8",
+    )
+    return str(path)
+
+
+def _read(path, **window):
+    return list(read_columns(path, MessageFilter(**window)).timestamp)
+
+
+def test_window_of_oldest_first_file(tmp_path):
+    path = _write(tmp_path, [1000, 2000, 3000])
+    assert _read(path, start=1500) == [2000, 3000]
+    assert _read(path, start=1500, end=3000) == [2000]
+
+
+def test_window_of_newest_first_file(tmp_path):
+    path = _write(tmp_path, [3000, 2000, 1000])
+    assert _read(path, start=1500) == [3000, 2000]
+    assert _read(path, start=3500) == []
+
+
+def test_prune_oldest_first_files(tmp_path):
+    newer = _write(tmp_path, [300, 400], 1)
+    older = _write(tmp_path, [200, 300], 2)
+    assert prune_files([newer, older], MessageFilter(start=350)) == [newer]
+    assert prune_files([newer, older], MessageFilter(end=300)) == [older]
+    assert prune_files([newer, older], MessageFilter(start=500)) == []
@@ -0,0 +1,27 @@
+from metrics.text.mentions import MentionMatcher
+
+PARTICIPANTS = ["Will Turner", "May Parker", "Mark Lee", "Alice Smith"]
+
+
+def _mentioned(matcher, text):
+    return [PARTICIPANTS[i] for i in matcher.match(text)]
+
+
+def test_first_names_match_as_written():
+    matcher = MentionMatcher(PARTICIPANTS, {"Alice Smith": ["Ali"]})
+    assert _mentioned(matcher, "Will and May are here, ask Ali") == [
+        "Will Turner",
+        "May Parker",
+        "Alice Smith",
+    ]
+    assert _mentioned(matcher, "I will be there in may, mark my words") == []
+    assert _mentioned(matcher, "ali baba") == []
+
+
+def test_full_names_and_at_mentions_ignore_case():
+    matcher = MentionMatcher(PARTICIPANTS, {"Alice Smith": ["Ali"]})
+    assert _mentioned(matcher, "will turner and MAY PARKER") == [
+        "Will Turner",
+        "May Parker",
+    ]
+    assert _mentioned(matcher, "@mark @ali") == ["Mark Lee", "Alice Smith"]
@@ -0,0 +1,28 @@
+import json
+
+from ingest.columns import read_columns
+from ingest.table import MessageTable
+from metrics.context import ChatContext
+from metrics.reacts.heatmap import ReactHeatmap
+
+
+def test_chat_without_reactions(tmp_path):
+    path = tmp_path / "message_1.json"
+    path.write_text(
+        json.dumps(
+            {
+                "participants": [{"name": "Alice Smith"}, {"name": "Bob Jones"}],
+                "messages": [
+                    {"sender_name": s, "timestamp_ms": t, "content": "hi"}
+                    for s, t in [("Bob Jones", 2000), ("Alice Smith", 1000)]
+                ],
+            }
+        ),
+        encoding="utf-8",
+    )
+    table = MessageTable.from_columns(read_columns(str(path)))
+    status, figures = ReactHeatmap(ChatContext.from_table(table)).compute()
+    assert status.success, status.message
+    titles = [f.title for f in figures]
+    assert "raw_reacts_heatmap" not in titles
+    assert "most_reacts_sent" in titles
@@ -0,0 +1,79 @@
+import json
+
+from ingest.columns import MessageFilter, read_columns
+from ingest.table import MessageTable
+from metrics.context import ChatContext
+from metrics.text.index import TextIndex
+from metrics.text.scan import scan_words
+
+
+def _table(tmp_path, messages):
+    path = tmp_path / "message_1.json"
+    path.write_text(
+        json.dumps(
+            {
+                "participants": [{"name": "Alice Smith"}, {"name": "Bob Jones"}],
+                "messages": [
+                    {
+                        "sender_name": s,
+                        "timestamp_ms": t,
+                        "content": c,
+                        "type": "Generic",
+                    }
+                    for s, t, c in messages
+                ],
+            }
+        ),
+        encoding="utf-8",
+    )
+    return MessageTable.from_columns(read_columns(str(path)))
+
+
+def _index(tmp_path, messages):
+    return TextIndex.from_table(_table(tmp_path, messages))
+
+
+def test_phrase_with_filter(tmp_path):
+    index = _index(
+        tmp_path,
+        [
+            ("Bob Jones", 5000, "hello"),
+            ("Bob Jones", 3000, "hello zebra"),
+            ("Alice Smith", 2000, "hello there zebra"),
+            ("Alice Smith", 1000, "hello zebra hello zebra"),
+        ],
+    )
+    senders, timestamps = index.hits("hello zebra")
+    assert sorted(timestamps.tolist()) == [1000, 3000]
+
+    # the only zebra left follows "there", and after 4000 only hello is left
+    assert len(index.select(MessageFilter(end=3000)).find("hello zebra")) == 1
+    assert (
+        len(index.select(MessageFilter(start=1500, end=3000)).find("hello zebra")) == 0
+    )
+    assert len(index.select(MessageFilter(start=4000)).find("hello zebra")) == 0
+    bob = index.select(MessageFilter(participants=frozenset(["Bob Jones"])))
+    senders, _ = bob.hits("hello zebra")
+    assert index.names[senders].tolist() == ["Bob Jones"]
+
+
+def test_exported_encoding_is_decoded(tmp_path):
+    # exports write the utf-8 bytes of texts as latin-1 characters
+    def exported(text):
+        return text.encode("utf-8").decode("latin-1")
+
+    table = _table(
+        tmp_path,
+        [
+            ("Bob Jones", 2000, exported("¿ñolo?")),
+            ("Alice Smith", 1000, exported("ñolo ñolo, señor")),
+        ],
+    )
+    index = TextIndex.from_table(table)
+    assert sorted(index.tokens.tolist()) == ["señor", "ñolo"]
+    assert len(index.find("ñolo")) == 2
+
+    scan = scan_words(ChatContext.from_table(table), ["ñolo"], capacity=10)
+    assert scan.filtered["ñolo"].to_dict() == {"Bob Jones": 1, "Alice Smith": 1}
+    words = {t for sketch in scan.words for t, _, _ in sketch.top(10)}
+    assert words == {"señor", "ñolo"}